@@ -7,9 +7,11 @@ Usage:
     python autoFiler.py --source "C:\My Photos\Phone" --dest "D:\Sorted" --mode photos
     python autoFiler.py /path/to/source /path/to/destination photos
 """
+import os
 import sys
-import re
+import errno
 import shutil
+import concurrent.futures
 from pathlib import Path
 import argparse
 
@@ -17,29 +19,69 @@ import argparse
 PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".heic", ".webp"}
 VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv", ".avi", ".flv", ".webm"}
 
-# Define separate regex patterns for maintainability
-FILENAME_PATTERNS = [
-    # Pattern 1: YYYY-MM-DD_HHMMSS or YYYY-MM-DD HH.MM.SS
-    re.compile(r"^(\d{4})-(\d{2})-(\d{2})[_\s](\d{2})[._](\d{2})[._](\d{2})"),
-    
-    # Pattern 2: Screenshot_YYYY-MM-DD_HHMMSS
-    re.compile(r"^Screenshot_(\d{4})-(\d{2})-(\d{2})[_\s](\d{2})[._](\d{2})[._](\d{2})"),
-    
-    # Pattern 3: IMG_YYYYMMDD_HHMMSS_xxx
-    re.compile(r"^IMG_(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})_\d+")
-]
+# Concurrent file moves
+MOVE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Supported filename shapes are all fixed-width, so they are checked with plain
+# string slicing at known offsets instead of going through the regex engine:
+#   YYYY-MM-DD_HH.MM.SS or YYYY-MM-DD HH.MM.SS (optionally prefixed by Screenshot_)
+#   IMG_YYYYMMDD_HHMMSS_xxx
+SCREENSHOT_PREFIX = "Screenshot_"
+IMG_PREFIX = "IMG_"
+
+def _match_dated(name: str, off: int):
+    """Match YYYY-MM-DD[_ ]HH[._]MM[._]SS starting at offset off."""
+    if len(name) < off + 19:
+        return None
+    if not (name[off:off + 4].isdecimal() and name[off + 4] == "-"
+            and name[off + 5:off + 7].isdecimal() and name[off + 7] == "-"
+            and name[off + 8:off + 10].isdecimal()
+            and (name[off + 10] == "_" or name[off + 10].isspace())
+            and name[off + 11:off + 13].isdecimal() and name[off + 13] in "._"
+            and name[off + 14:off + 16].isdecimal() and name[off + 16] in "._"
+            and name[off + 17:off + 19].isdecimal()):
+        return None
+    return name[off:off + 4], name[off + 5:off + 7], name[off + 8:off + 10]
+
+def _match_plain(name: str):
+    """Match YYYY-MM-DD... at the start of the name."""
+    return _match_dated(name, 0)
+
+def _match_screenshot(name: str):
+    """Match Screenshot_YYYY-MM-DD..."""
+    if not name.startswith(SCREENSHOT_PREFIX):
+        return None
+    return _match_dated(name, len(SCREENSHOT_PREFIX))
+
+def _match_img(name: str):
+    """Match IMG_YYYYMMDD_HHMMSS_<digits>."""
+    if len(name) < 21 or not name.startswith(IMG_PREFIX):
+        return None
+    if not (name[4:12].isdecimal() and name[12] == "_"
+            and name[13:19].isdecimal() and name[19] == "_"
+            and name[20].isdecimal()):
+        return None
+    return name[4:8], name[8:10], name[10:12]
+
+# Every shape starts with a distinct character (digit, 'S' or 'I'), so the
+# first character picks the only parser that can possibly match.
+FILENAME_PARSERS = {c: _match_plain for c in "0123456789"}
+FILENAME_PARSERS["S"] = _match_screenshot
+FILENAME_PARSERS["I"] = _match_img
 
 def match_filename(file_name: str):
     """
     Try to match the filename against known patterns.
     Returns (year, month, day) if matched, else None.
     """
-    for pattern in FILENAME_PATTERNS:
-        match = pattern.match(file_name)
-        if match:
-            year, month, day = match.group(1), match.group(2), match.group(3)
-            return year, month, day
-    return None
+    parser = FILENAME_PARSERS.get(file_name[:1])
+    if parser is None:
+        # Non-ASCII Unicode digits (e.g. Arabic-Indic) matched the old \d
+        # patterns too, so they still go to the plain parser.
+        if file_name[:1].isdecimal():
+            return _match_plain(file_name)
+        return None
+    return parser(file_name)
 
 def reconstruct_from_tokens(tokens):
     """
@@ -134,6 +176,34 @@ def parse_args(argv=None):
                  "or\n"
                  "  python autoFiler.py /path/to/source /path/to/dest photos")
 
+def iter_files(root: str):
+    """
+    Yield an os.DirEntry for every regular file below root.
+    Walks with os.scandir so file/dir checks come from the cached dirent type
+    instead of a stat() and a Path object per entry.
+    """
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            entries = list(it)   # snapshot: files may be moved away while we iterate
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+def move_file(src, dst):
+    """
+    Move src to dst with a plain rename when both are on the same filesystem,
+    skipping shutil.move's extra checks; fall back to it across devices.
+    """
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
 def organize_files(source_dir: Path, dest_dir: Path, mode: str):
     if not source_dir.is_dir():
         print(f"Source directory does not exist: {source_dir}")
@@ -143,28 +213,51 @@ def organize_files(source_dir: Path, dest_dir: Path, mode: str):
 
     extensions = PHOTO_EXTENSIONS if mode == "photos" else VIDEO_EXTENSIONS
 
-    for file_path in source_dir.rglob("*"):
-        if not file_path.is_file():
-            continue
-        if file_path.suffix.lower() not in extensions:
-            continue
-        
-        result = match_filename(file_path.name)
-        if result:
-            year, month, day = result
-            target_dir = dest_dir / year / f"{year}{month}"
-            target_dir.mkdir(parents=True, exist_ok=True)
-
-            dest_file = target_dir / file_path.name
-            counter = 1
-            while dest_file.exists():
-                dest_file = target_dir / f"{file_path.stem}_{counter}{file_path.suffix}"
-                counter += 1
-
-            print(f"Moving {file_path} -> {dest_file}")
-            shutil.move(str(file_path), str(dest_file))
-        else:
-            print(f"Skipping unrecognized filename format: {file_path.name}")
+    # Moves are I/O-bound (rename or copy), so overlap them on a thread pool.
+    # Destination names are picked here, serially. `buckets` maps each "YYYYMM"
+    # key to its folder and the names already in it (read with one scandir the
+    # first time the folder is seen) plus names claimed by pending moves, so
+    # collisions are resolved in memory and two in-flight moves never race for
+    # the same file. Keying on the plain string also means the folder Path is
+    # only built once per month rather than once per file.
+    buckets = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MOVE_WORKERS) as executor:
+        futures = []
+        for entry in iter_files(str(source_dir)):
+            name = entry.name
+            stem, dot, ext = name.rpartition(".")
+            suffix = dot + ext
+            if not dot or suffix.lower() not in extensions:
+                continue
+
+            result = match_filename(name)
+            if result:
+                year, month, day = result
+                key = year + month
+                bucket = buckets.get(key)
+                if bucket is None:
+                    target_dir = dest_dir / year / key
+                    target_dir.mkdir(parents=True, exist_ok=True)
+                    with os.scandir(target_dir) as it:
+                        names = {os.path.normcase(e.name) for e in it}
+                    bucket = buckets[key] = (str(target_dir), names)
+                target_dir, names = bucket
+
+                dest_name = name
+                counter = 1
+                while os.path.normcase(dest_name) in names:
+                    dest_name = f"{stem}_{counter}{suffix}"
+                    counter += 1
+                names.add(os.path.normcase(dest_name))
+                dest_file = os.path.join(target_dir, dest_name)
+
+                print(f"Moving {entry.path} -> {dest_file}")
+                futures.append(executor.submit(move_file, entry.path, dest_file))
+            else:
+                print(f"Skipping unrecognized filename format: {name}")
+
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
 
 
 def main():
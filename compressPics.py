@@ -16,6 +16,13 @@ Options:
     --strip-exif            Remove EXIF metadata (saves space, zero pixel loss)
     --min-size MB           Skip files smaller than this (default: 1.0 MB)
     --max-size MB           Target ceiling after compression (default: 1.5 MB)
+    --lossless-first        For JPEGs, try a lossless jpegtran repack first and
+                            keep it if it is smaller than the original and
+                            already meets the compression target
+
+Optional:
+    pip install PyTurboJPEG numpy   (plus the system libturbojpeg) for a faster
+                                    JPEG quality search
 
 Examples:
     python3 compressPics.py ~/Photos
@@ -28,18 +35,39 @@ import io
 import sys
 import shutil
 import argparse
+import platform
 import subprocess
 import importlib
+import multiprocessing
 import concurrent.futures
 
 # === DEFAULTS ===
 DEFAULT_MAX_SIZE_MB = 1.5
 DEFAULT_MIN_SIZE_MB = 1.0
 TARGET_RATIO        = 0.25     # aim for ~25% of original size as a starting target
+PROBE_QUALITY       = 75       # first JPEG quality tried; later guesses are derived from its size
 SUPPORTED_FORMATS   = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+SUPPORTED_EXT_SET   = frozenset(SUPPORTED_FORMATS)
+POOL_WORKERS        = os.cpu_count() or 1
+if sys.platform == "win32":
+    POOL_WORKERS = min(POOL_WORKERS, 61)              # Windows wait limit for process pools
+MAX_IN_FLIGHT       = 2 * POOL_WORKERS               # queued compress jobs per pool
+
+JPEGTRAN = shutil.which("jpegtran")   # optional, used by --lossless-first
 
 
 # === DEPENDENCY CHECK ===
+def _prefer_pillow_simd() -> bool:
+    """True on x86_64 CPUs with AVX2, where Pillow-SIMD's vectorised resize/encode pays off."""
+    if platform.machine().lower() not in ("x86_64", "amd64"):
+        return False
+    try:
+        with open("/proc/cpuinfo") as f:
+            return " avx2" in f.read()
+    except OSError:
+        return False
+
+
 def ensure_dependencies():
     try:
         importlib.import_module("PIL")
@@ -49,12 +77,27 @@ def ensure_dependencies():
     if sys.platform == "win32":
         print("⚠️  Pillow not found. Install it with:  pip install Pillow")
         sys.exit(1)
+    if _prefer_pillow_simd():
+        # Drop-in Pillow fork; builds from source, so fall back if that fails.
+        print("⚠️  Installing Pillow-SIMD...")
+        if subprocess.call([sys.executable, "-m", "pip", "install", "pillow-simd"]) == 0:
+            return
+        print("⚠️  Pillow-SIMD install failed, falling back to Pillow...")
     print("⚠️  Installing Pillow...")
     subprocess.check_call([sys.executable, "-m", "pip", "install", "Pillow"])
 
 ensure_dependencies()
 from PIL import Image  # noqa: E402 — imported after dependency check
 
+# Optional: PyTurboJPEG (needs the system libturbojpeg) speeds up the quality
+# search by encoding straight from one shared RGB array.
+try:
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    _TJ = TurboJPEG()
+except Exception:   # module missing or libturbojpeg not found
+    _TJ = None
+
 
 # === IMAGE HELPERS ===
 
@@ -62,20 +105,33 @@ def get_size_mb(data: bytes) -> float:
     return len(data) / (1024 * 1024)
 
 
-def _save_jpeg(img: Image.Image, quality: int, exif_bytes: bytes | None) -> bytes:
-    buf = io.BytesIO()
-    out = img
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Return img as RGB, compositing any transparency onto white."""
     if img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
         bg = Image.new("RGB", img.size, (255, 255, 255))
-        bg.paste(img.convert("RGBA"), mask=img.convert("RGBA").split()[-1])
-        out = bg
-    elif img.mode != "RGB":
-        out = img.convert("RGB")
-
+        bg.paste(rgba, mask=rgba.getchannel("A"))
+        return bg
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def _write_jpeg(img: Image.Image, quality: int, exif_bytes: bytes | None,
+                buf: io.BytesIO) -> int:
+    """Encode img as JPEG into buf (overwriting it) and return the size in bytes."""
+    buf.seek(0)
+    buf.truncate()
     params = {"format": "JPEG", "optimize": True, "quality": quality}
     if exif_bytes:
         params["exif"] = exif_bytes
-    out.save(buf, **params)
+    _to_rgb(img).save(buf, **params)
+    return buf.tell()
+
+
+def _save_jpeg(img: Image.Image, quality: int, exif_bytes: bytes | None) -> bytes:
+    buf = io.BytesIO()
+    _write_jpeg(img, quality, exif_bytes, buf)
     return buf.getvalue()
 
 
@@ -98,7 +154,8 @@ def compress_image_data(
     Return compressed image bytes, trying to stay under target_mb.
     Strategy:
       PNG  → lossless zlib max compression; quantize only if still > max_mb.
-      JPEG → binary-search quality between 20–92; downscale only as last resort.
+      JPEG → predict quality (20–92) from a probe encode, falling back to a
+             binary search; downscale only as last resort.
     """
     fmt = (img_format or "JPEG").upper()
     kept_exif = None if strip_exif else exif_bytes
@@ -109,38 +166,85 @@ def compress_image_data(
         if get_size_mb(data) <= max_mb:
             return data
         # Lossy fallback: convert to JPEG
+        img = _to_rgb(img)
         data = _save_jpeg(img, quality=85, exif_bytes=kept_exif)
         if get_size_mb(data) <= max_mb:
             return data
-        fmt = "JPEG"   # fall through to JPEG binary search below
+        fmt = "JPEG"   # fall through to the JPEG quality search below
 
-    # ── JPEG: binary search on quality ──────────────────────────────────────
-    low, high = 20, 92
-    best_under: bytes | None = None       # highest quality that fits
-    smallest: bytes | None  = None        # absolute smallest produced
+    # ── JPEG: predict quality from one probe, binary search as fallback ─────
+    img = _to_rgb(img)                    # flatten once; every probe/resize below reuses it
+    q_min, q_max = 20, 92
+    best_q: int | None = None             # highest quality that fits
+    smallest_q: int | None = None         # quality of the absolute smallest produced
     smallest_mb = float("inf")
+    kept: dict[int, bytes] = {}           # Pillow output for best_q / smallest_q
+    buf = io.BytesIO()                    # reused by every Pillow probe
+
+    # With PyTurboJPEG, probes only measure the size, encoding from one RGB
+    # array converted up front; the chosen quality is then encoded once with
+    # Pillow so EXIF and Huffman optimisation still apply.
+    rgb = None
+    if _TJ is not None:
+        rgb = np.ascontiguousarray(np.asarray(img))
+        exif_len = len(kept_exif) + 4 if kept_exif else 0   # APP1 marker + length
+
+    def probe(q: int) -> float:
+        nonlocal best_q, smallest_q, smallest_mb
+        if rgb is not None:
+            size = len(_TJ.encode(rgb, quality=q, pixel_format=TJPF_RGB,
+                                  jpeg_subsample=TJSAMP_420)) + exif_len
+        else:
+            size = _write_jpeg(img, q, kept_exif, buf)
+        mb = size / (1024 * 1024)
 
-    while low <= high:
-        q = (low + high) // 2
-        data = _save_jpeg(img, quality=q, exif_bytes=kept_exif)
-        mb = get_size_mb(data)
-
+        changed = False
         if mb < smallest_mb:
-            smallest_mb = mb
-            smallest = data
-
-        if mb <= target_mb:
-            best_under = data
-            low = q + 1           # try to keep higher quality
-        else:
+            smallest_q, smallest_mb = q, mb
+            changed = True
+        if mb <= target_mb and (best_q is None or q > best_q):
+            best_q = q
+            changed = True
+        if changed and rgb is None:
+            kept[q] = buf.getvalue()
+            for stale in kept.keys() - {best_q, smallest_q}:
+                del kept[stale]
+        return mb
+
+    def encoded(q: int) -> bytes:
+        return kept.get(q) or _save_jpeg(img, quality=q, exif_bytes=kept_exif)
+
+    # JPEG size is roughly monotonic in quality, so the size at PROBE_QUALITY
+    # is enough to guess the right quality directly in most cases.
+    mb = probe(PROBE_QUALITY)
+    if mb <= target_mb:
+        q = min(q_max, PROBE_QUALITY + round((target_mb / mb - 1) * 50))
+        if q > PROBE_QUALITY:
+            probe(q)
+    else:
+        q, high = PROBE_QUALITY, PROBE_QUALITY - 1
+        for _ in range(2):
+            q = max(q_min, min(high, int(q * (target_mb / mb) ** 0.7)))
+            mb = probe(q)
+            if mb <= target_mb or q == q_min:
+                break
             high = q - 1
-
-    if best_under is not None:
-        return best_under
+        else:
+            # Predictor overshot twice — binary search what is left of the range
+            low = q_min
+            while low <= high:
+                q = (low + high) // 2
+                if probe(q) <= target_mb:
+                    low = q + 1           # try to keep higher quality
+                else:
+                    high = q - 1
+
+    if best_q is not None:
+        return encoded(best_q)
 
     # Quality-only result is still under the hard ceiling — accept it
-    if smallest is not None and smallest_mb <= max_mb:
-        return smallest
+    if smallest_q is not None and smallest_mb <= max_mb:
+        return encoded(smallest_q)
 
     # ── Last resort: limited downscale (max 3 steps, never below 73% of original) ──
     w, h = img.size
@@ -148,15 +252,34 @@ def compress_image_data(
     current = img
     for _ in range(3):
         nw, nh = max(1, int(w * scale)), max(1, int(h * scale))
-        resized = current.resize((nw, nh), Image.LANCZOS)
-        q = max(20, (low + high) // 2) if low <= high else 55
-        data = _save_jpeg(resized, quality=q, exif_bytes=kept_exif)
+        # Bilinear is much cheaper than Lanczos and the difference is lost
+        # in JPEG quantisation at these quality levels.
+        resized = current.resize((nw, nh), Image.BILINEAR)
+        data = _save_jpeg(resized, quality=55, exif_bytes=kept_exif)
         if get_size_mb(data) <= max_mb:
             return data
         current = resized
         scale *= 0.90
 
-    return smallest or _save_jpeg(img, quality=55, exif_bytes=kept_exif)
+    if smallest_q is not None:
+        return encoded(smallest_q)
+    return _save_jpeg(img, quality=55, exif_bytes=kept_exif)
+
+
+def jpegtran_optimize(path: str, strip_exif: bool) -> bytes | None:
+    """
+    Losslessly repack a JPEG with jpegtran (optimized Huffman tables,
+    progressive scan) without decoding any pixels. Returns None if jpegtran
+    is not installed or fails.
+    """
+    if not JPEGTRAN:
+        return None
+    cmd = [JPEGTRAN, "-optimize", "-progressive",
+           "-copy", "none" if strip_exif else "all", path]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout
 
 
 # === SINGLE FILE ===
@@ -174,19 +297,37 @@ def compress_file(path: str, args) -> tuple[str, float, float | None, str]:
     target_mb = min(args.max_size, original_mb * TARGET_RATIO)
 
     try:
-        with Image.open(path) as img:
-            try:
-                exif = img.getexif()
-                exif_bytes = exif.tobytes() if exif else None
-            except Exception:
+        result = None
+        if args.lossless_first and path.lower().endswith(('.jpg', '.jpeg')):
+            data = jpegtran_optimize(path, args.strip_exif)
+            # Only worth keeping if it actually shrank the file and meets the
+            # same target as the lossy path; a repack can grow optimized JPEGs.
+            if data is not None:
+                repacked_mb = get_size_mb(data)
+                if repacked_mb < original_mb and repacked_mb <= target_mb:
+                    result = data
+
+        if result is None:
+            with Image.open(path) as img:
+                # Reuse the raw EXIF blob as-is (the image is never rotated, so
+                # nothing in it changes); only re-serialise when the format
+                # keeps EXIF as parsed tags (e.g. TIFF).
                 exif_bytes = None
-
-            img_format = img.format or "JPEG"
-            img.load()   # load fully before closing the file handle
-            result = compress_image_data(
-                img, img_format, target_mb, args.max_size,
-                exif_bytes, args.strip_exif
-            )
+                if not args.strip_exif:
+                    exif_bytes = img.info.get("exif")
+                    if not exif_bytes:
+                        try:
+                            exif = img.getexif()
+                            exif_bytes = exif.tobytes() if exif else None
+                        except Exception:
+                            exif_bytes = None
+
+                img_format = img.format or "JPEG"
+                img.load()   # load fully before closing the file handle
+                result = compress_image_data(
+                    img, img_format, target_mb, args.max_size,
+                    exif_bytes, args.strip_exif
+                )
 
         if args.backup:
             backup_dir = os.path.join(os.path.dirname(path), ".backup")
@@ -207,23 +348,58 @@ def compress_file(path: str, args) -> tuple[str, float, float | None, str]:
 
 # === SCAN ===
 
-def collect_images(directory: str, recursive: bool) -> list[str]:
+def is_supported(name: str) -> bool:
+    """Extension check that only lowercases the short suffix, not the whole name."""
+    dot = name.rfind(".")
+    return dot >= 0 and name[dot:].lower() in SUPPORTED_EXT_SET
+
+
+def collect_images(directory: str, recursive: bool) -> list[tuple[str, float]]:
+    """
+    Return sorted (path, size_mb) pairs for supported images. Sizes come from
+    the scandir entries, so the size filter needs no separate getsize() pass.
+    """
     images = []
-    if recursive:
-        for root, dirs, files in os.walk(directory):
-            # Skip backup folders we created
-            dirs[:] = [d for d in dirs if d != ".backup"]
-            for f in files:
-                if f.lower().endswith(SUPPORTED_FORMATS):
-                    images.append(os.path.join(root, f))
-    else:
-        for f in os.listdir(directory):
-            p = os.path.join(directory, f)
-            if os.path.isfile(p) and f.lower().endswith(SUPPORTED_FORMATS):
-                images.append(p)
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # Skip backup folders we created; like os.walk, don't follow dir symlinks
+                    if recursive and entry.name != ".backup" and not entry.is_symlink():
+                        stack.append(entry.path)
+                elif entry.is_file() and is_supported(entry.name):
+                    images.append((entry.path, entry.stat().st_size / (1024 * 1024)))
     return sorted(images)
 
 
+# === WORKER POOL ===
+
+def _pool_context():
+    """Fork workers where possible so they inherit the already-imported Pillow."""
+    if sys.platform == "win32":
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def iter_results(executor, fn, items, args):
+    """
+    Run fn(item, args) on the executor and yield results as they finish.
+    Keeps at most MAX_IN_FLIGHT tasks queued so a huge batch doesn't pickle
+    every job into the pool up front.
+    """
+    pending = set()
+    for item in items:
+        if len(pending) >= MAX_IN_FLIGHT:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(fn, item, args))
+    for future in concurrent.futures.as_completed(pending):
+        yield future.result()
+
+
 # === MAIN ===
 
 def main():
@@ -245,6 +421,9 @@ def main():
                         metavar="MB", help=f"Skip files smaller than this (default: {DEFAULT_MIN_SIZE_MB})")
     parser.add_argument("--max-size", type=float, default=DEFAULT_MAX_SIZE_MB,
                         metavar="MB", help=f"Target maximum size (default: {DEFAULT_MAX_SIZE_MB})")
+    parser.add_argument("--lossless-first", action="store_true",
+                        help="For JPEGs, keep a lossless jpegtran repack if it is smaller than the "
+                             "original and already meets the compression target")
     args = parser.parse_args()
 
     if not os.path.isdir(args.directory):
@@ -259,8 +438,7 @@ def main():
 
     # ── Preview table ────────────────────────────────────────────────────────
     will_compress, will_skip = [], []
-    for p in images:
-        mb = os.path.getsize(p) / (1024 * 1024)
+    for p, mb in images:
         if mb < args.min_size:
             will_skip.append((p, mb))
         else:
@@ -287,6 +465,11 @@ def main():
         print("  Originals will be backed up to .backup/ in each folder.")
     if args.strip_exif:
         print("  EXIF metadata will be stripped.")
+    if args.lossless_first:
+        if JPEGTRAN:
+            print("  JPEGs will be repacked losslessly first when that is enough.")
+        else:
+            print("  jpegtran not found; --lossless-first has no effect.")
     if not args.recursive:
         print("  Subdirectories are NOT included (use -r to include them).")
 
@@ -305,10 +488,9 @@ def main():
     print()
     paths_only = [p for p, _ in will_compress]
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        futures = {executor.submit(compress_file, p, args): p for p in paths_only}
-        for future in concurrent.futures.as_completed(futures):
-            path, orig_mb, final_mb, status = future.result()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=POOL_WORKERS,
+                                                mp_context=_pool_context()) as executor:
+        for path, orig_mb, final_mb, status in iter_results(executor, compress_file, paths_only, args):
             rel = os.path.relpath(path, args.directory)
             if status == "skipped":
                 print(f"⏭️   skipped (too small)          {rel}")
@@ -2,9 +2,12 @@
 """
 Video Compressor Script
 -----------------------
-Re-encodes videos with libx265 (HEVC) for significant size reduction.
+Re-encodes videos to HEVC for significant size reduction, using a hardware
+encoder (NVENC / QSV / VideoToolbox / AMF) when one works, else libx265.
 Always previews files and asks for confirmation before making any changes.
-Replaces the original only if the compressed file is meaningfully smaller.
+Replaces the original only if the compressed file is meaningfully smaller;
+a few short sample encodes predict the final size first, so files that
+won't shrink enough are skipped without a full encode.
 
 Usage:
     python3 compressVids.py /path/to/directory [options]
@@ -12,11 +15,24 @@ Usage:
 Options:
     -r, --recursive         Also process subdirectories (opt-in)
     -y, --yes               Skip confirmation prompt
-    --backup                Copy originals to .backup/ before replacing
+    --backup                Move originals to .backup/ instead of deleting them
     --min-size MB           Skip files smaller than this (default: 5.0 MB)
     --ratio RATIO           Only keep compressed file if smaller than this
                             fraction of the original (default: 0.5 = 50%)
-    --crf N                 libx265 CRF quality (default: 28; lower = better)
+    --crf N                 libx265 CRF quality (default: 28; lower = better).
+                            Mapped to the closest constant-quality setting
+                            for hardware encoders.
+    --encoder NAME          auto (default), libx265, hevc_nvenc, hevc_qsv,
+                            hevc_videotoolbox or hevc_amf
+    --auto-crf              Pick the CRF per file with sample encodes, aiming
+                            just under the --ratio threshold (range 20–40)
+    --tune NAME             libx265 tuning: auto (default; "animation" for
+                            files or folders named anime/cartoon/…), none,
+                            animation or grain
+    -j, --jobs N            Concurrent encodes (default: 1 for hardware
+                            encoders, CPU cores / 4 for libx265)
+    --rescan                Ignore the skip list of files handled by earlier
+                            runs (kept in .compressvids.db in the directory)
 
 Examples:
     python3 compressVids.py ~/Videos
@@ -27,20 +43,57 @@ Examples:
 import os
 import sys
 import re
-import json
 import shutil
 import subprocess
-import threading
-import time
 import argparse
 import tempfile
+import concurrent.futures
+import functools
+import sqlite3
+import time
+
+# Optional: PyAV probes files in-process through libavformat, which is much
+# cheaper than spawning an ffprobe per file. ffprobe is used when it's missing.
+try:
+    import av
+except ImportError:
+    av = None
 
 # === DEFAULTS ===
 DEFAULT_MIN_SIZE_MB        = 5.0
 DEFAULT_MIN_COMPRESS_RATIO = 0.5   # keep new file only if < 50% of original
 DEFAULT_CRF                = 28    # libx265 quality (18–28 is sane; 28 = default)
-SAMPLE_SECONDS             = 20    # seconds of encoding used to estimate final size
+PROBE_CLIP_SECONDS         = 5     # length of each sample encode used to estimate final size
+PROBE_POINTS               = (0.25, 0.5, 0.75)  # where the samples are taken, as fractions of the duration
+AUDIO_BITRATE_KBPS         = 128
+PROGRESS_PERIOD_SECONDS    = 1     # how often ffmpeg reports progress (its default is 0.5)
+CRF_SEARCH_RANGE           = (20, 40)     # --auto-crf bounds (lower = better quality)
+CRF_TARGET_WINDOW          = (0.80, 0.95) # --auto-crf aims for this fraction of the --ratio threshold
 SUPPORTED_FORMATS          = ('.mp4', '.mkv', '.mov', '.avi', '.flv', '.wmv')
+SUPPORTED_EXT_SET          = frozenset(SUPPORTED_FORMATS)
+PROBE_WORKERS              = 32    # ffprobe runs are process-start/disk bound, not CPU bound
+EFFICIENT_CODECS           = frozenset({"hevc", "h265", "av1"})  # already compact; re-encoding gains ~nothing
+HW_HEVC_ENCODERS           = ("hevc_nvenc", "hevc_qsv", "hevc_videotoolbox", "hevc_amf")
+NVENC_PRESETS              = {"fast": "p2", "medium": "p4", "slow": "p6"}
+PRESET                     = "medium"
+CORES_PER_X265_JOB         = 4     # libx265 scales well up to ~4 cores per encode
+
+# Skip list: outcome per file from earlier runs, keyed by (path, size, mtime)
+SKIP_DB_NAME        = ".compressvids.db"
+RESULT_SHRUNK       = "shrunk"
+RESULT_UNCHANGED    = "unchanged"
+RESULT_FAILED       = "failed"
+RESULT_ALREADY_HEVC = "already_hevc"
+
+# --tune auto: path keywords (file name or any parent folder) that select an x265 tune
+TUNE_KEYWORDS = {
+    "animation": ("anime", "animation", "animated", "cartoon", "cartoons"),
+    "grain":     ("grain", "grainy", "16mm", "35mm"),
+}
+TUNE_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Video encoder lines in `ffmpeg -encoders`, e.g. " V....D hevc_nvenc   NVIDIA NVENC hevc encoder"
+ENCODER_LINE_RE = re.compile(r"^\s*V\S*\s+(\S+)", re.MULTILINE)
 
 FFMPEG  = shutil.which("ffmpeg")
 FFPROBE = shutil.which("ffprobe")
@@ -52,28 +105,58 @@ if not FFMPEG or not FFPROBE:
 
 # === HELPERS ===
 
-def get_video_info(path: str) -> tuple[float | None, float]:
-    """Return (duration_seconds, size_mb). duration is None on error."""
+def get_video_info(path: str) -> tuple[float | None, float, str | None]:
+    """
+    Return (duration_seconds, size_mb, video_codec).
+    duration / video_codec are None on error.
+    """
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    if av is not None:
+        try:
+            with av.open(path) as container:
+                duration = container.duration / av.time_base if container.duration else None
+                video    = container.streams.video
+                # codec.canonical_name is the format's codec ("av1", "hevc"),
+                # matching ffprobe's codec_name; codec_context.name is the
+                # decoder picked for it (e.g. "libdav1d") and would never
+                # match EFFICIENT_CODECS.
+                vcodec   = video[0].codec_context.codec.canonical_name if video else None
+            return duration, size_mb, vcodec
+        except Exception:
+            pass   # let ffprobe have a go
     try:
-        cmd = [FFPROBE, "-v", "error", "-show_entries", "format=duration",
-               "-of", "json", path]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        info = json.loads(result.stdout)
-        duration = float(info["format"]["duration"])
-        size_mb  = os.path.getsize(path) / (1024 * 1024)
-        return duration, size_mb
+        # csv=p=0 prints one bare value per section: the stream's codec_name
+        # (if there is a video stream) followed by the format's duration.
+        cmd = [FFPROBE, "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "stream=codec_name:format=duration",
+               "-of", "csv=p=0", path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        lines = result.stdout.split()
     except Exception:
-        return None, os.path.getsize(path) / (1024 * 1024)
+        return None, size_mb, None
+    if not lines:
+        return None, size_mb, None
+    vcodec = lines[0].decode("ascii", "replace") if len(lines) > 1 else None
+    try:
+        duration = float(lines[-1])
+    except ValueError:
+        duration = None
+    return duration, size_mb, vcodec
 
 
 def has_audio(path: str) -> bool:
     """Return True if the file contains at least one audio stream."""
+    if av is not None:
+        try:
+            with av.open(path) as container:
+                return bool(container.streams.audio)
+        except Exception:
+            pass
     try:
         cmd = [FFPROBE, "-v", "error", "-select_streams", "a",
-               "-show_entries", "stream=index", "-of", "json", path]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        info = json.loads(result.stdout)
-        return bool(info.get("streams"))
+               "-show_entries", "stream=index", "-of", "csv=p=0", path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return bool(result.stdout.strip())
     except Exception:
         return False
 
@@ -86,28 +169,169 @@ def fmt_duration(seconds: float) -> str:
     return f"{m}m {s:02d}s" if m else f"{s}s"
 
 
-def hms_to_seconds(hms: str) -> float:
+def detect_hevc_encoder(crf: int = DEFAULT_CRF) -> str:
+    """
+    Return the first hardware HEVC encoder that actually works here, else
+    libx265. ffmpeg lists encoders it was built with even when the matching
+    GPU/driver is missing, so each candidate gets a tiny test encode, using
+    the same rate-control flags as the real run (some encoders accept -c:v
+    alone but reject their quality mode).
+    """
+    try:
+        listing = subprocess.run([FFMPEG, "-hide_banner", "-encoders"],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 text=True).stdout
+    except Exception:
+        return "libx265"
+    built = set(ENCODER_LINE_RE.findall(listing))
+    for enc in HW_HEVC_ENCODERS:
+        if enc not in built:
+            continue
+        test = [FFMPEG, "-hide_banner", "-nostdin", "-loglevel", "error",
+                "-f", "lavfi", "-i", "color=black:s=256x256:d=0.1",
+                *video_codec_args(enc, crf), "-f", "null", "-"]
+        try:
+            if subprocess.run(test, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              timeout=30).returncode == 0:
+                return enc
+        except Exception:
+            pass
+    return "libx265"
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_has_option(option: str) -> bool:
+    """
+    True if this ffmpeg build accepts the given global option. Checked once
+    against `ffmpeg -h full`; e.g. -stats_period only exists from ffmpeg 4.4,
+    and older builds (Ubuntu 20.04 ships 4.2) reject the whole command.
+    """
     try:
-        hh, mm, ss = hms.split(":")
-        return int(hh) * 3600 + int(mm) * 60 + float(ss)
+        help_text = subprocess.run([FFMPEG, "-hide_banner", "-h", "full"],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   text=True).stdout
     except Exception:
-        return 0.0
+        return False
+    return re.search(rf"^\s*{re.escape(option)}\b", help_text, re.MULTILINE) is not None
 
 
-def collect_videos(directory: str, recursive: bool) -> list[str]:
-    videos = []
-    if recursive:
-        for root, dirs, files in os.walk(directory):
-            dirs[:] = [d for d in dirs if d != ".backup"]
-            for f in files:
-                if f.lower().endswith(SUPPORTED_FORMATS):
-                    videos.append(os.path.join(root, f))
+def default_jobs(encoder: str) -> int:
+    """
+    Concurrent encodes that keep the machine busy without thrashing: a
+    hardware encoder is the bottleneck itself, so one job; libx265 gets a
+    job per CORES_PER_X265_JOB cores.
+    """
+    if encoder != "libx265":
+        return 1
+    return max(1, (os.cpu_count() or 1) // CORES_PER_X265_JOB)
+
+
+@functools.lru_cache(maxsize=None)
+def _tune_for_words(text: str) -> str:
+    words = set(TUNE_WORD_RE.findall(text.lower()))
+    for tune, keywords in TUNE_KEYWORDS.items():
+        if words.intersection(keywords):
+            return tune
+    return ""
+
+
+def detect_tune(path: str) -> str:
+    """
+    Guess an x265 -tune from the file name, then from its folder path
+    (cached per folder, so siblings in e.g. "Anime/Show S01" cost nothing).
+    Returns "" for the default tuning.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return _tune_for_words(stem) or _tune_for_words(os.path.dirname(os.path.abspath(path)))
+
+
+def video_codec_args(encoder: str, crf: int, threads: int = 0, tune: str = "") -> list[str]:
+    """
+    ffmpeg video codec flags for encoder, with the libx265 CRF mapped onto
+    the encoder's own constant-quality knob. threads > 0 caps the encoder's
+    CPU threads so concurrent jobs share the cores instead of oversubscribing.
+    tune only applies to libx265; the hardware encoders have no equivalent.
+    """
+    if encoder == "hevc_nvenc":
+        return ["-c:v", encoder, "-rc", "vbr", "-cq", str(crf), "-b:v", "0",
+                "-preset", NVENC_PRESETS.get(PRESET, "p4")]
+    if encoder == "hevc_qsv":
+        return ["-c:v", encoder, "-global_quality", str(crf), "-preset", PRESET]
+    if encoder == "hevc_videotoolbox":
+        # -q:v runs 1–100 with higher = better; CRF 28 lands around 50.
+        return ["-c:v", encoder, "-q:v", str(max(1, min(100, round(100 - crf * 1.8))))]
+    if encoder == "hevc_amf":
+        return ["-c:v", encoder, "-rc", "cqp", "-qp_i", str(crf), "-qp_p", str(crf),
+                "-quality", "balanced"]
+    args = ["-c:v", "libx265", "-crf", str(crf), "-preset", PRESET]
+    if tune:
+        args += ["-tune", tune]
+    return args + ["-x265-params", x265_params(threads)]
+
+
+def x265_params(threads: int = 0) -> str:
+    """
+    x265 threading for one encode. libx265 ignores -threads, so the pool
+    size is set here: with a single job (threads == 0) the encode gets every
+    core plus parallel mode/motion decisions to keep them busy; with
+    concurrent jobs each gets its share of cores and only 2 frame threads,
+    so N encodes x M threads roughly equals the core count.
+    """
+    ncpu = os.cpu_count() or 4
+    if threads:
+        params = f"pools={threads}:frame-threads=2:wpp=1"
     else:
-        for f in os.listdir(directory):
-            p = os.path.join(directory, f)
-            if os.path.isfile(p) and f.lower().endswith(SUPPORTED_FORMATS):
-                videos.append(p)
-    return sorted(videos)
+        params = f"pools={ncpu}:frame-threads={min(ncpu, 16)}:wpp=1:pmode=1:pme=1"
+    # x265 logs its own banner and stats to stderr regardless of -loglevel.
+    return params + ":log-level=error"
+
+
+def is_supported(name: str) -> bool:
+    """Extension check that only lowercases the short suffix, not the whole name."""
+    dot = name.rfind(".")
+    return dot >= 0 and name[dot:].lower() in SUPPORTED_EXT_SET
+
+
+def iter_videos(root: str, recursive: bool):
+    """
+    Yield the path of every supported video below root (skipping .backup/).
+    Walks with os.scandir so file/dir checks come from the cached dirent type
+    instead of a stat() per entry.
+    """
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and entry.name != ".backup":
+                        stack.append(entry.path)
+                elif is_supported(entry.name) and entry.is_file():
+                    yield entry.path
+
+
+def collect_videos(directory: str, recursive: bool) -> list[str]:
+    return sorted(iter_videos(directory, recursive))
+
+
+def drop_page_cache(path: str) -> None:
+    """
+    Tell the kernel we're done with path's pages. Every input and output is
+    read or written exactly once, so over a large batch they would otherwise
+    push everything else out of the page cache. No-op where posix_fadvise
+    isn't available (Windows, macOS).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
 def verify_output(path: str) -> bool:
@@ -119,23 +343,80 @@ def verify_output(path: str) -> bool:
     try:
         cmd = [FFPROBE, "-v", "error",
                "-show_entries", "format=duration:stream=codec_type",
-               "-of", "json", path]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                text=True, timeout=30)
+               "-of", "csv=p=0", path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=30)
         if result.returncode != 0:
             return False
-        info = json.loads(result.stdout)
-        if not info.get("format", {}).get("duration"):
+        # One codec_type line per stream, then the format duration last.
+        *stream_types, duration = result.stdout.split() or [b""]
+        if not duration or duration == b"N/A":
             return False
-        streams = info.get("streams", [])
-        return any(s.get("codec_type") == "video" for s in streams)
+        return b"video" in stream_types
     except Exception:
         return False
 
 
+# === SKIP LIST ===
+
+def open_skip_db(directory: str) -> sqlite3.Connection:
+    db = sqlite3.connect(os.path.join(directory, SKIP_DB_NAME))
+    db.execute("PRAGMA journal_mode=WAL")   # tolerate two runs on the same tree
+    db.execute("CREATE TABLE IF NOT EXISTS done ("
+               "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, result TEXT, settings TEXT)")
+    # Databases from before settings were recorded: their rows read as NULL
+    # settings, which never match, so those files are simply looked at again.
+    if "settings" not in {row[1] for row in db.execute("PRAGMA table_info(done)")}:
+        db.execute("ALTER TABLE done ADD COLUMN settings TEXT")
+    return db
+
+
+def load_skip_list(directory: str) -> dict[str, tuple[int, int, str, str | None]]:
+    """
+    The skip list as {relative path: (size, mtime_ns, result, settings)}.
+    Read-only: nothing is created in the tree if there is no database yet.
+    """
+    db_path = os.path.join(directory, SKIP_DB_NAME)
+    if not os.path.exists(db_path):
+        return {}
+    db = open_skip_db(directory)
+    try:
+        return {path: (size, mtime_ns, result, settings)
+                for path, size, mtime_ns, result, settings in db.execute(
+                    "SELECT path, size, mtime_ns, result, settings FROM done")}
+    finally:
+        db.close()
+
+
+def skip_settings(args) -> str:
+    """
+    The options a recorded outcome depends on; a change invalidates it.
+    args.encoder must already be resolved from "auto". x265 thread counts
+    are left out: they follow --jobs and the number of files left, and only
+    change how the encode is scheduled, not its quality target.
+    """
+    crf = "auto" if args.auto_crf else args.crf
+    return (f"encoder={args.encoder} preset={PRESET} crf={crf} tune={args.tune} "
+            f"ratio={args.ratio} min_size={args.min_size}")
+
+
+def record_result(db: sqlite3.Connection, directory: str, path: str, result: str,
+                  settings: str) -> None:
+    """Remember path's outcome against its current size, mtime and settings."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    db.execute("INSERT OR REPLACE INTO done VALUES (?, ?, ?, ?, ?)",
+               (os.path.relpath(path, directory), st.st_size, st.st_mtime_ns, result, settings))
+    db.commit()
+
+
 # === COMPRESSION ===
 
-def build_ffmpeg_cmd(input_path: str, output_path: str, crf: int, audio: bool) -> list[str]:
+def build_ffmpeg_cmd(input_path: str, output_path: str, crf: int, audio: bool,
+                     encoder: str = "libx265", threads: int = 0, tune: str = "",
+                     max_bytes: int = 0) -> list[str]:
     """
     Build the ffmpeg command.
 
@@ -157,129 +438,244 @@ def build_ffmpeg_cmd(input_path: str, output_path: str, crf: int, audio: bool) -
                       prevents wrapped-around timestamps from older containers
                       causing sync drift in the output.
     -fflags +genpts   Regenerate PTS for any stream that is missing them.
+    -progress pipe:1  Machine-readable progress on stdout (see run_ffmpeg);
+                      -nostats / -loglevel error keep stderr for real errors.
+    -stats_period     Progress ticks once a second, so the wrapper wakes
+                      half as often as with ffmpeg's default. Only added when
+                      the build supports it (ffmpeg >= 4.4); run_ffmpeg
+                      throttles its own output either way.
+    -fs max_bytes     Stop cleanly (exit 0, valid container) once the output
+                      reaches the size at which it would be rejected anyway.
+    -nostdin          Don't read keypresses from (or reconfigure) the terminal;
+                      with --jobs > 1 several encodes would fight over it.
     """
     cmd = [
-        FFMPEG, "-y",
+        FFMPEG, "-y", "-nostdin",
+        "-progress", "pipe:1",
+        *(["-stats_period", str(PROGRESS_PERIOD_SECONDS)] if ffmpeg_has_option("-stats_period") else []),
+        "-nostats", "-loglevel", "error",
         "-fflags", "+genpts",
         "-i", input_path,
         "-map", "0",              # keep all streams (video, audio, subtitles)
         "-map_metadata", "0",
-        "-c:v", "libx265",
-        "-crf", str(crf),
-        "-preset", "medium",
+        *video_codec_args(encoder, crf, threads, tune),
         "-vtag", "hvc1",
         "-avoid_negative_ts", "make_zero",
     ]
     if audio:
         # Re-encode audio; 128k is transparent for AAC-LC on most content.
-        cmd += ["-c:a", "aac", "-b:a", "128k", "-ar", "48000"]
+        cmd += ["-c:a", "aac", "-b:a", f"{AUDIO_BITRATE_KBPS}k", "-ar", "48000"]
     else:
         cmd += ["-an"]
     # Subtitle streams: copy as-is (text subs are container-level, no timing issue).
     cmd += ["-c:s", "copy"]
     cmd += ["-movflags", "+faststart"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    if max_bytes:
+        cmd += ["-fs", str(max_bytes)]
     cmd.append(output_path)
     return cmd
 
 
-def run_ffmpeg(cmd: list[str], duration: float | None,
-               temp_path: str, size_mb: float,
-               accept_threshold_mb: float) -> tuple[int, bool]:
+def probe_encode(path: str, duration: float, crf: int, encoder: str,
+                 threads: int = 0, cap_mb: float | None = None,
+                 tune: str = "") -> float | None:
     """
-    Run ffmpeg, stream stderr, do the early-abort sample check.
-    Returns (returncode, aborted_early).
-    Guarantees the process is dead and temp_path is cleaned up on early abort.
+    Estimate the encoded video size in MB from a few short sample encodes
+    (PROBE_CLIP_SECONDS each, at PROBE_POINTS through the file), so a file
+    that won't compress enough costs seconds instead of a full encode.
+
+    Samples are written as raw HEVC to stdout and simply measured. cap_mb is
+    the size above which the file would be rejected anyway; each sample is
+    capped (-fs) at that budget so a hopeless probe stops early.
+    Returns None when the estimate can't be made (probe failed).
     """
-    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
-                            text=True, bufsize=1)
-
-    last_time_str: dict[str, str | None] = {"val": None}
-    time_re = re.compile(r"time=(\d+:\d+:\d+\.\d+)")
-
-    def stderr_reader(stream, outdict):
+    sampled_s = PROBE_CLIP_SECONDS * len(PROBE_POINTS)
+    fs_cap    = []
+    if cap_mb:
+        fs_cap = ["-fs", str(int(cap_mb * 1024 * 1024 * sampled_s / duration) + 1)]
+    total = 0
+    for point in PROBE_POINTS:
+        cmd = [FFMPEG, "-hide_banner", "-nostdin", "-loglevel", "error",
+               "-ss", f"{duration * point:.3f}", "-t", str(PROBE_CLIP_SECONDS),
+               "-i", path, "-map", "0:v:0", "-an", "-sn",
+               *video_codec_args(encoder, crf, threads, tune), *fs_cap,
+               "-f", "hevc", "-"]
         try:
-            while True:
-                chunk = stream.read(1024)
-                if not chunk:
-                    break
-                sys.stderr.write(chunk)
-                sys.stderr.flush()
-                for m in time_re.finditer(chunk):
-                    outdict["val"] = m.group(1)
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         except Exception:
-            pass
+            return None
+        if result.returncode != 0 or not result.stdout:
+            return None
+        total += len(result.stdout)
+    return total * duration / sampled_s / (1024 * 1024)
 
-    reader = threading.Thread(target=stderr_reader, args=(proc.stderr, last_time_str), daemon=True)
-    reader.start()
 
-    start   = time.monotonic()
-    sampled = False
+def search_crf(path: str, duration: float, size_mb: float, audio_mb: float,
+               args, tune: str = "") -> tuple[int | None, float] | None:
+    """
+    Binary-search the CRF whose sample-encode estimate lands inside
+    CRF_TARGET_WINDOW of the keep threshold: the best quality that still
+    gets kept. Each CRF is probed at most once; 3–4 probes usually suffice.
 
-    while True:
-        elapsed = time.monotonic() - start
-        if proc.poll() is not None:
+    Returns (crf, estimated_ratio), with crf None when even the highest CRF
+    tried misses the threshold, or None if a sample encode failed.
+    """
+    threshold = args.ratio
+    target_lo = threshold * CRF_TARGET_WINDOW[0]
+    target_hi = threshold * CRF_TARGET_WINDOW[1]
+    estimates: dict[int, float] = {}
+
+    def estimate(crf: int) -> float | None:
+        if crf not in estimates:
+            video_mb = probe_encode(path, duration, crf, args.encoder, args.threads,
+                                    cap_mb=size_mb * threshold, tune=tune)
+            if video_mb is None:
+                return None
+            estimates[crf] = (video_mb + audio_mb) / size_mb
+        return estimates[crf]
+
+    lo, hi = CRF_SEARCH_RANGE
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        r   = estimate(mid)
+        if r is None:
+            return None
+        if r > target_hi:
+            lo = mid        # too big: compress harder
+        elif r < target_lo:
+            hi = mid        # smaller than needed: afford better quality
+        else:
+            return mid, r
+    # No CRF landed in the window; take the best quality that is still kept.
+    if hi not in estimates and estimate(hi) is None:
+        return None
+    kept = [crf for crf, r in estimates.items() if r < threshold]
+    if not kept:
+        return None, estimates[hi]
+    best = min(kept)
+    return best, estimates[best]
+
+
+def run_ffmpeg(cmd: list[str], duration: float | None, show_progress: bool = True) -> int:
+    """
+    Run ffmpeg to completion, following its -progress stream for the
+    progress line. Returns ffmpeg's exit code.
+
+    -progress pipe:1 writes key=value lines to stdout, one block per tick
+    (PROGRESS_PERIOD_SECONDS) ending in progress=continue|end, so there is no regex and no
+    stderr pump thread; stderr only carries real errors (-loglevel error).
+    The stream is pure ASCII, so it is read as bytes with no text decoding.
+    The line is redrawn at most once per PROGRESS_PERIOD_SECONDS, which also
+    covers ffmpeg builds without -stats_period (ticking every 0.5 s).
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=None)
+
+    progress: dict[bytes, bytes] = {}
+    next_draw = 0.0
+
+    for line in proc.stdout:
+        key, _, value = line.strip().partition(b"=")
+        progress[key] = value
+        if key != b"progress":
+            continue
+
+        # A full progress block has arrived.
+        now = time.monotonic()
+        if duration and show_progress and (now >= next_draw or value == b"end"):
+            next_draw = now + PROGRESS_PERIOD_SECONDS
+            # ffmpeg reports bytes written itself (total_size), so there is
+            # no need to stat() the file it is still writing.
+            try:
+                enc_seconds = int(progress.get(b"out_time_us", b"")) / 1e6
+            except ValueError:
+                enc_seconds = 0.0
+            try:
+                written_mb = int(progress.get(b"total_size", b"")) / (1024 * 1024)
+            except ValueError:
+                written_mb = 0.0
+            pct = min(100.0, enc_seconds / duration * 100)
+            print(f"\r⏳  {fmt_duration(enc_seconds)} / {fmt_duration(duration)} "
+                  f"({pct:.0f}%)  {written_mb:.1f} MB  "
+                  f"speed {progress.get(b'speed', b'?').strip().decode()}   ",
+                  end="", flush=True)
+
+        if value == b"end":
             break
 
-        if not sampled and elapsed >= SAMPLE_SECONDS:
-            sampled = True
-            try:
-                if os.path.exists(temp_path) and duration:
-                    bytes_written = os.path.getsize(temp_path)
-                    parsed        = last_time_str.get("val")
-                    enc_seconds   = hms_to_seconds(parsed) if parsed else elapsed
-                    kbps          = (bytes_written * 8) / enc_seconds / 1000.0 if enc_seconds > 0 else 0.0
-                    est_mb        = (kbps * 1000.0 / 8.0) * duration / (1024 * 1024)
-
-                    print(f"\n🔎  Sample ({int(enc_seconds)}s encoded): "
-                          f"{bytes_written/(1024*1024):.2f} MB written, ~{kbps:.0f} kbit/s")
-                    print(f"🔮  Estimated final size: {est_mb:.2f} MB "
-                          f"({est_mb/size_mb*100:.0f}% of original)")
-
-                    if est_mb >= accept_threshold_mb:
-                        print("⚠️   Estimate won't meet threshold. Aborting early.")
-                        # SIGTERM is cleaner than SIGINT: ffmpeg handles it as a
-                        # graceful stop, flushing headers before exit, which means
-                        # the temp file won't be partially written in a way that
-                        # looks valid but is corrupt.
-                        proc.terminate()
-                        try:
-                            proc.wait(timeout=10)
-                        except subprocess.TimeoutExpired:
-                            proc.kill()
-                            proc.wait()
-                        reader.join(timeout=2)
-                        if os.path.exists(temp_path):
-                            os.remove(temp_path)
-                        return proc.returncode or 0, True
-                    else:
-                        print("✅  Estimate looks good. Continuing to completion.")
-            except Exception as e:
-                print(f"⚠️   Sample check failed ({e}). Continuing.")
-
-        time.sleep(0.5)
-
-    rc = proc.wait()
-    reader.join(timeout=2)
-    return rc, False
-
-
-def compress_video(path: str, args) -> None:
-    duration, size_mb = get_video_info(path)
-    audio             = has_audio(path)
+    if show_progress:
+        print()
+    proc.stdout.close()
+    return proc.wait()
+
+
+def compress_video(path: str, args, info: tuple | None = None) -> str:
+    """
+    info is a get_video_info() result already probed during the scan.
+    Returns the outcome for the skip list: one of the RESULT_* constants.
+    """
+    duration, size_mb, vcodec = info or get_video_info(path)
+    if vcodec in EFFICIENT_CODECS:
+        print(f"\n⏭️   Already {vcodec}, skipping: {os.path.relpath(path, args.directory)}")
+        return RESULT_ALREADY_HEVC
+    audio = has_audio(path)
 
     base_dir  = os.path.dirname(path)
     base_name = os.path.splitext(os.path.basename(path))[0]
     final_path = os.path.join(base_dir, base_name + ".mkv")
 
     accept_threshold_mb = size_mb * args.ratio
-
-    print(f"\n{'─'*60}")
-    print(f"🔧  {os.path.relpath(path, args.directory)}")
-    print(f"    Size     : {size_mb:.2f} MB")
+    rel_path            = os.path.relpath(path, args.directory)
+    # With concurrent jobs the output of several files interleaves, so tag
+    # per-file messages with the name and skip the live progress line.
+    concurrent_jobs     = args.jobs > 1
+    label               = f"[{os.path.basename(path)}] " if concurrent_jobs else ""
+
+    # Header is printed in a single call so concurrent jobs don't interleave it.
+    header = [f"\n{'─'*60}",
+              f"🔧  {rel_path}",
+              f"    Size     : {size_mb:.2f} MB"]
     if duration:
-        print(f"    Duration : {fmt_duration(duration)}")
-    print(f"    Audio    : {'yes (re-encoding to AAC)' if audio else 'none'}")
-    print(f"    Keep if  : < {accept_threshold_mb:.2f} MB  ({args.ratio*100:.0f}% of original)")
+        header.append(f"    Duration : {fmt_duration(duration)}")
+    header.append(f"    Audio    : {'yes (re-encoding to AAC)' if audio else 'none'}")
+    header.append(f"    Keep if  : < {accept_threshold_mb:.2f} MB  ({args.ratio*100:.0f}% of original)")
+    tune = ""
+    if args.encoder == "libx265":
+        tune = detect_tune(path) if args.tune == "auto" else args.tune.replace("none", "")
+        if tune:
+            header.append(f"    Tune     : {tune}")
+    print("\n".join(header))
+
+    # Sample encodes first: only worth it when the file is long enough that
+    # the samples are a small fraction of the full encode.
+    crf      = args.crf
+    sampling = bool(duration) and duration > PROBE_CLIP_SECONDS * len(PROBE_POINTS) * 4
+    audio_mb = AUDIO_BITRATE_KBPS * 1000 / 8 * duration / (1024 * 1024) if sampling and audio else 0.0
+    if sampling and args.auto_crf:
+        found = search_crf(path, duration, size_mb, audio_mb, args, tune)
+        if found is None:
+            print(f"⚠️   {label}Sample encode failed. Using CRF {crf} for the full encode.")
+        elif found[0] is None:
+            print(f"⚠️   Even CRF {CRF_SEARCH_RANGE[1]} is estimated at {found[1]*100:.0f}% "
+                  f"of original. Original kept: {rel_path}")
+            return RESULT_UNCHANGED
+        else:
+            crf = found[0]
+            print(f"🎯  {label}CRF {crf}: estimated {found[1]*size_mb:.2f} MB "
+                  f"({found[1]*100:.0f}% of original)")
+    elif sampling:
+        video_mb = probe_encode(path, duration, crf, args.encoder, args.threads,
+                                cap_mb=accept_threshold_mb, tune=tune)
+        if video_mb is None:
+            print(f"⚠️   {label}Sample encode failed. Going straight to the full encode.")
+        else:
+            est_mb = video_mb + audio_mb
+            print(f"🔮  {label}Estimated final size: {est_mb:.2f} MB "
+                  f"({est_mb/size_mb*100:.0f}% of original)")
+            if est_mb >= accept_threshold_mb:
+                print(f"⚠️   Estimate won't meet threshold. Original kept: {rel_path}")
+                return RESULT_UNCHANGED
 
     # Write temp file into the same directory so os.replace() is atomic
     # (same filesystem). Use a proper tempfile so the name is unique even
@@ -287,66 +683,81 @@ def compress_video(path: str, args) -> None:
     fd, temp_path = tempfile.mkstemp(suffix=".tmp.mkv", dir=base_dir)
     os.close(fd)
 
-    cmd = build_ffmpeg_cmd(path, temp_path, args.crf, audio)
+    # The sample estimate can be off (or was skipped for short files); -fs
+    # makes ffmpeg give up by itself as soon as the output is too big to keep.
+    max_bytes = int(accept_threshold_mb * 1024 * 1024)
+    cmd = build_ffmpeg_cmd(path, temp_path, crf, audio, args.encoder, args.threads, tune,
+                           max_bytes)
     print(f"    Command  : {' '.join(cmd)}\n")
 
     try:
-        rc, aborted = run_ffmpeg(cmd, duration, temp_path, size_mb, accept_threshold_mb)
+        rc = run_ffmpeg(cmd, duration, show_progress=not concurrent_jobs)
     except Exception as e:
-        print(f"\n❌  Unexpected error: {e}")
+        print(f"\n❌  {label}Unexpected error: {e}")
         if os.path.exists(temp_path):
             os.remove(temp_path)
-        return
-
-    if aborted:
-        return  # temp already cleaned up inside run_ffmpeg
+        return RESULT_FAILED
+    drop_page_cache(path)   # the input has been read once and won't be again
 
     if rc != 0:
-        print(f"\n❌  ffmpeg exited with code {rc}.")
+        print(f"\n❌  {label}ffmpeg exited with code {rc}.")
         if os.path.exists(temp_path):
             os.remove(temp_path)
-        return
+        return RESULT_FAILED
 
     if not os.path.exists(temp_path):
-        print(f"\n❌  Output not found: {temp_path}")
-        return
+        print(f"\n❌  {label}Output not found: {temp_path}")
+        return RESULT_FAILED
+
+    final_mb = os.path.getsize(temp_path) / (1024 * 1024)
+    if final_mb >= accept_threshold_mb:
+        os.remove(temp_path)
+        print(f"⚠️   Hit the {accept_threshold_mb:.2f} MB size cap. Original kept: {rel_path}")
+        return RESULT_UNCHANGED
 
     # Structural sanity check before touching the original
-    print("🔍  Verifying output integrity…")
+    print(f"🔍  {label}Verifying output integrity…")
     if not verify_output(temp_path):
-        print("❌  Output failed integrity check (truncated or no video stream). Original kept.")
+        print(f"❌  {label}Output failed integrity check (truncated or no video stream). Original kept.")
         os.remove(temp_path)
-        return
+        return RESULT_FAILED
 
-    final_mb = os.path.getsize(temp_path) / (1024 * 1024)
-    ratio    = final_mb / size_mb if size_mb > 0 else 1.0
-    print(f"✅  Encoded: {final_mb:.2f} MB  ({ratio*100:.0f}% of original)")
-
-    if final_mb < accept_threshold_mb:
-        if args.backup:
-            backup_dir = os.path.join(base_dir, ".backup")
-            os.makedirs(backup_dir, exist_ok=True)
-            shutil.copy2(path, os.path.join(backup_dir, os.path.basename(path)))
-        # Atomic replace: move temp into final position first, then remove
-        # the original if it had a different extension.
-        os.replace(temp_path, final_path)
-        if os.path.abspath(path) != os.path.abspath(final_path):
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-        saved = size_mb - final_mb
-        print(f"🗑️   Replaced original. Saved {saved:.2f} MB → {os.path.relpath(final_path, args.directory)}")
-    else:
+    ratio = final_mb / size_mb if size_mb > 0 else 1.0
+    print(f"✅  {label}Encoded: {final_mb:.2f} MB  ({ratio*100:.0f}% of original)")
+
+    # The temp file was created next to the original so this replace is a
+    # rename; on another device it would silently become a full copy.
+    if os.stat(temp_path).st_dev != os.stat(base_dir).st_dev:
+        print(f"❌  {label}Temp file is not on the same device as {base_dir}. Original kept.")
         os.remove(temp_path)
-        print(f"⚠️   Not worth it. Original kept: {os.path.relpath(path, args.directory)}")
+        return RESULT_FAILED
+    # mkstemp creates the file 0600; give the output the original's mode.
+    shutil.copymode(path, temp_path)
+    if args.backup:
+        backup_dir = os.path.join(base_dir, ".backup")
+        os.makedirs(backup_dir, exist_ok=True)
+        # The original is leaving anyway, so move it instead of copying
+        # it; .backup/ sits on the same volume, so this is a rename too.
+        shutil.move(path, os.path.join(backup_dir, os.path.basename(path)))
+    # Atomic replace: move temp into final position first, then remove
+    # the original if it had a different extension.
+    os.replace(temp_path, final_path)
+    drop_page_cache(final_path)
+    if not args.backup and os.path.abspath(path) != os.path.abspath(final_path):
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+    saved = size_mb - final_mb
+    print(f"🗑️   Replaced original. Saved {saved:.2f} MB → {os.path.relpath(final_path, args.directory)}")
+    return RESULT_SHRUNK
 
 
 # === MAIN ===
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Safely re-encode videos to HEVC (libx265).",
+        description="Safely re-encode videos to HEVC (hardware encoder or libx265).",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog=__doc__,
     )
@@ -356,7 +767,7 @@ def main():
     parser.add_argument("-y", "--yes", action="store_true",
                         help="Skip confirmation prompt")
     parser.add_argument("--backup", action="store_true",
-                        help="Copy originals to .backup/ before replacing")
+                        help="Move originals to .backup/ instead of deleting them")
     parser.add_argument("--min-size", type=float, default=DEFAULT_MIN_SIZE_MB,
                         metavar="MB", help=f"Skip files smaller than this (default: {DEFAULT_MIN_SIZE_MB})")
     parser.add_argument("--ratio", type=float, default=DEFAULT_MIN_COMPRESS_RATIO,
@@ -365,6 +776,19 @@ def main():
     parser.add_argument("--crf", type=int, default=DEFAULT_CRF,
                         metavar="N",
                         help=f"libx265 CRF quality value (default: {DEFAULT_CRF}; lower = better quality / larger file)")
+    parser.add_argument("--encoder", default="auto",
+                        choices=("auto", "libx265") + HW_HEVC_ENCODERS,
+                        help="HEVC encoder (default: auto = first working hardware encoder, else libx265)")
+    parser.add_argument("--auto-crf", action="store_true",
+                        help=f"Choose the CRF per file ({CRF_SEARCH_RANGE[0]}–{CRF_SEARCH_RANGE[1]}) "
+                             "from sample encodes, aiming just under the --ratio threshold")
+    parser.add_argument("--tune", default="auto", choices=("auto", "none", "animation", "grain"),
+                        help="libx265 -tune (default: auto = animation/grain from file or folder name)")
+    parser.add_argument("-j", "--jobs", type=int, default=0, metavar="N",
+                        help="Concurrent encodes (default: 1 for hardware encoders, CPU cores / "
+                             f"{CORES_PER_X265_JOB} for libx265)")
+    parser.add_argument("--rescan", action="store_true",
+                        help=f"Ignore the skip list of files handled by earlier runs ({SKIP_DB_NAME})")
     args = parser.parse_args()
 
     if not os.path.isdir(args.directory):
@@ -377,15 +801,45 @@ def main():
         print("No supported videos found.")
         sys.exit(0)
 
+    # ── Skip list: files unchanged since an earlier run decided on them ──────
+    # Only final outcomes count: a failure (ffmpeg killed, disk full, ...) is
+    # retried, and so is anything decided under a different encoder, CRF,
+    # tune, --ratio or --min-size. The encoder is resolved first so "auto"
+    # is recorded as the encoder it actually picked.
+    if args.encoder == "auto":
+        args.encoder = detect_hevc_encoder(args.crf)
+    settings = skip_settings(args)
+    if not args.rescan:
+        done, remaining = load_skip_list(args.directory), []
+        for p in videos:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue   # gone since the scan
+            hit = done.get(os.path.relpath(p, args.directory))
+            if (hit is None or hit[2] == RESULT_FAILED or hit[3] != settings
+                    or hit[:2] != (st.st_size, st.st_mtime_ns)):
+                remaining.append(p)
+        if len(remaining) < len(videos):
+            print(f"\n⏭️   Skipping {len(videos) - len(remaining)} file(s) handled by an earlier run "
+                  "(use --rescan to include them).")
+        videos = remaining
+        if not videos:
+            print("\nNothing to compress.")
+            sys.exit(0)
+
     # ── Preview table ────────────────────────────────────────────────────────
-    will_compress, will_skip = [], []
+    will_compress, will_skip, already_done = [], [], []
     print("\nScanning files…")
-    for p in videos:
-        duration, size_mb = get_video_info(p)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(videos))) as tp:
+        infos = list(tp.map(get_video_info, videos))
+    for p, (duration, size_mb, vcodec) in zip(videos, infos):
         if size_mb < args.min_size:
             will_skip.append((p, size_mb, duration))
+        elif vcodec in EFFICIENT_CODECS:
+            already_done.append((p, size_mb, vcodec))
         else:
-            will_compress.append((p, size_mb, duration))
+            will_compress.append((p, size_mb, duration, vcodec))
 
     if will_skip:
         print(f"\n⏭️   Skipping {len(will_skip)} file(s) smaller than {args.min_size} MB:")
@@ -393,22 +847,41 @@ def main():
             dur_str = fmt_duration(dur) if dur else "?"
             print(f"   {mb:6.2f} MB  {dur_str:>10}  {os.path.relpath(p, args.directory)}")
 
+    if already_done:
+        print(f"\n⏭️   Skipping {len(already_done)} file(s) already in HEVC/AV1:")
+        for p, mb, vcodec in already_done:
+            print(f"   {mb:6.2f} MB  {vcodec:>10}  {os.path.relpath(p, args.directory)}")
+
+    def record_already_done(db):
+        for p, _, _ in already_done:
+            record_result(db, args.directory, p, RESULT_ALREADY_HEVC, settings)
+
     if not will_compress:
+        if already_done:
+            db = open_skip_db(args.directory)
+            record_already_done(db)
+            db.close()
         print("\nNothing to compress.")
         sys.exit(0)
 
-    total_mb  = sum(mb for _, mb, _ in will_compress)
-    total_dur = sum(d for _, _, d in will_compress if d)
+    total_mb  = sum(mb for _, mb, _, _ in will_compress)
+    total_dur = sum(d for _, _, d, _ in will_compress if d)
 
     print(f"\nFiles to compress ({len(will_compress)}):")
     print(f"  {'Size':>8}   {'Duration':>10}   Path")
     print(f"  {'----':>8}   {'--------':>10}   ----")
-    for p, mb, dur in will_compress:
+    for p, mb, dur, _ in will_compress:
         dur_str = fmt_duration(dur) if dur else "unknown"
         print(f"  {mb:>7.2f}MB   {dur_str:>10}   {os.path.relpath(p, args.directory)}")
     print(f"\n  Total : {total_mb:.2f} MB  /  {fmt_duration(total_dur)}")
     print(f"  Keep new file only if < {args.ratio*100:.0f}% of original size")
-    print(f"  CRF: {args.crf}  |  Audio: re-encoded to AAC 128k")
+    args.jobs    = max(1, min(args.jobs or default_jobs(args.encoder), len(will_compress)))
+    # Split the cores between concurrent jobs; a single job keeps ffmpeg's own default.
+    args.threads = max(1, (os.cpu_count() or 1) // args.jobs) if args.jobs > 1 else 0
+    crf_str = "auto" if args.auto_crf else str(args.crf)
+    print(f"  Encoder: {args.encoder}  |  CRF: {crf_str}  |  Audio: re-encoded to AAC 128k")
+    if args.jobs > 1:
+        print(f"  Jobs   : {args.jobs} concurrent encodes, {args.threads} threads each")
     if args.backup:
         print("  Originals will be backed up to .backup/ before replacing.")
     if not args.recursive:
@@ -425,10 +898,26 @@ def main():
             print("Aborted.")
             sys.exit(0)
 
-    # ── Compress (sequential — video encoding is CPU-bound) ──────────────────
+    # ── Compress ─────────────────────────────────────────────────────────────
+    # The skip list is only created once the run is confirmed, so an aborted
+    # run leaves nothing behind in the video tree.
+    db = open_skip_db(args.directory)
+    record_already_done(db)
+    # Each job is just an ffmpeg child process, so threads are enough to run
+    # several side by side; the Python side only waits on pipes.
     print()
-    for p, _, _ in will_compress:
-        compress_video(p, args)
+    # Outcomes are recorded here, on the main thread, so the sqlite
+    # connection is never shared between workers.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(compress_video, p, args, (dur, mb, vcodec)): p
+                   for p, mb, dur, vcodec in will_compress}
+        for future in concurrent.futures.as_completed(futures):
+            p      = futures[future]
+            result = future.result()
+            if result == RESULT_SHRUNK:
+                p = os.path.splitext(p)[0] + ".mkv"
+            record_result(db, args.directory, p, result, settings)
+    db.close()
 
     print(f"\n{'─'*60}")
     print("🎬  All done!")
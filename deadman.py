@@ -51,7 +51,7 @@
 #    - No sensitive material remains on the originating system.
 #
 # Dependencies:
-# - gpg, shred, cron
+# - gpg, cron
 # - Python libraries: google-api-python-client, google-auth-httplib2, google-auth-oauthlib
 #
 # Usage Examples:
@@ -62,6 +62,7 @@
 
 import os
 import argparse
+import concurrent.futures
 import json
 import secrets
 import shutil
@@ -93,67 +94,110 @@ def confirm(msg):
     return ans in ("y", "yes")
 
 def send_email(base_dir, to, subject, body, attachments=None, cc=None, bcc=None):
-    cred_path = base_dir / "credentials.json"
-    cmd = [
-        "python3", str(SENDEMAIL_PATH),
-        "-c", str(cred_path),
-        "-t", to,
-        "-s", subject,
-        "-m", body
-    ]
-    if cc:
-        if isinstance(cc, list):
-            cc = ",".join(cc)
-        cmd += ["--cc", cc]
-    if bcc:
-        if isinstance(bcc, list):
-            bcc = ",".join(bcc)
-        cmd += ["--bcc", bcc]
-    if attachments:
-        attachments = [str(a) for a in attachments]
-        cmd += ["-a"] + attachments
-    run(cmd, check=True)
+    # Call sendEmail.py's functions in-process rather than running it as a
+    # script: no second interpreter start-up or re-import of the Google client.
+    # Imported here so `setup` can still offer to install the dependencies first.
+    try:
+        import sendEmail
+    except ImportError as e:
+        die(f"Cannot load sendEmail.py (it must sit next to deadman.py, with the Gmail dependencies installed): {e}")
+    # get_gmail_service caches the client, so a second send reuses it.
+    service = sendEmail.get_gmail_service(str(base_dir / "credentials.json"))
+    sendEmail.send_email(
+        service, 'me', to, subject, body,
+        attachment_paths=[str(a) for a in attachments] if attachments else None,
+        cc=cc,
+        bcc=bcc
+    )
+
+# On SSDs and other flash storage the controller remaps blocks on every write
+# (wear levelling), so extra overwrite passes only land on fresh cells and the
+# old data is unreachable through the filesystem either way; they just multiply
+# the bytes written. One random pass, then a hole punch so the filesystem
+# discards the blocks (and can TRIM them), is as good as shred -n 5 there.
+SHRED_PASSES = 1           # random overwrite passes before the final discard/zero pass
+SHRED_CHUNK = 1024 * 1024  # bytes written per os.pwrite call
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+def punch_hole(fd, size):
+    # Deallocate [0, size) with fallocate(FALLOC_FL_PUNCH_HOLE). Returns False
+    # where that is unavailable (non-Linux, or the filesystem doesn't support it).
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fallocate = libc.fallocate
+    except (OSError, AttributeError):
+        return False
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    return fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, 0, size) == 0
+
+def shred_file(path):
+    # Overwrite a file in place with SHRED_PASSES passes of random data, then
+    # punch out its blocks (falling back to a pass of zeros where hole punching
+    # is unsupported), fsyncing after each step, then unlink it.
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        size = os.fstat(fd).st_size
+        for _ in range(SHRED_PASSES):
+            offset = 0
+            while offset < size:
+                offset += os.pwrite(fd, os.urandom(min(SHRED_CHUNK, size - offset)), offset)
+            os.fsync(fd)
+        if size and not punch_hole(fd, size):
+            zeros = bytes(min(size, SHRED_CHUNK))
+            offset = 0
+            while offset < size:
+                offset += os.pwrite(fd, zeros[:size - offset], offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.unlink(path)
 
 def shred_and_remove_dir(target_dir: Path):
     print(f"Shredding directory: {target_dir}")
-    for root, dirs, files in os.walk(target_dir, topdown=False):
-        for name in files:
-            file_path = Path(root) / name
-            run(["shred", "-vzu", "-n", "5", str(file_path)])
-            file_path.unlink(missing_ok=True)
-        for name in dirs:
-            dir_path = Path(root) / name
-            try:
-                dir_path.rmdir()
-            except OSError:
-                pass
-    try:
-        target_dir.rmdir()
-    except OSError:
-        shutil.rmtree(target_dir, ignore_errors=True)
+    # One scandir walk shreds every regular file; whatever is left (now-empty
+    # directories, symlinks) goes in a single rmtree.
+    stack = [str(target_dir)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    try:
+                        shred_file(entry.path)
+                    except OSError as e:
+                        print(f"[!] Could not shred {entry.path}: {e}")
+    shutil.rmtree(target_dir, ignore_errors=True)
     print("Directory shredded successfully.")
 
+def update_crontab(cron_tag: str, new_line: str = None) -> bool:
+    # Single crontab read-modify-write: drop every line tagged cron_tag and
+    # append new_line, if given. Returns False (and writes nothing) when there
+    # was no change to make.
+    proc = subprocess.run(["crontab", "-l"], capture_output=True, text=True)
+    current = proc.stdout.splitlines() if proc.returncode == 0 else []
+    lines = [l for l in current if cron_tag not in l]
+    if new_line:
+        lines.append(new_line)
+    elif len(lines) == len(current):
+        return False
+    subprocess.run(["crontab", "-"], input="\n".join(lines) + "\n", text=True, check=True)
+    return True
+
 def remove_cron_job(switch_id: str):
-    cron_tag = f"DEADMAN_{switch_id}"
-    proc = subprocess.run(["crontab", "-l"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if proc.returncode != 0:
-        print("No existing crontab or unable to read crontab.")
-        return
-    lines = [l for l in proc.stdout.splitlines() if cron_tag not in l]
-    if len(lines) == len(proc.stdout.splitlines()):
-        print("Cron job not found; nothing to remove.")
-        return
-    p = subprocess.Popen(["crontab", "-"], stdin=subprocess.PIPE, text=True)
-    p.communicate("\n".join(lines) + "\n")
-    print("Cron job removed successfully.")
+    if update_crontab(f"DEADMAN_{switch_id}"):
+        print("Cron job removed successfully.")
+    else:
+        print("Cron job not found (or no readable crontab); nothing to remove.")
 
 def trigger_deadman(BASE: Path, config: dict, CONFIG_FILE: Path, args_id: str):
     trigger_count = config.get("trigger_count", 0)
     data_dir = BASE / "data"
-    attachments = [
-        p for p in data_dir.iterdir()
-        if p.is_file()
-    ]
+    # DirEntry.is_file() answers from the cached d_type, no stat() per entry
+    with os.scandir(data_dir) as it:
+        attachments = [Path(e.path) for e in it if e.is_file(follow_symlinks=False)]
     send_email(
         BASE,
         config["recipient"],
@@ -174,10 +218,6 @@ def trigger_deadman(BASE: Path, config: dict, CONFIG_FILE: Path, args_id: str):
         remove_cron_job(args_id)
         print("Deadman switch disabled permanently. All sensitive files removed.")
 
-SENDEMAIL_PATH = Path(__file__).parent / "sendEmail.py"
-if not SENDEMAIL_PATH.exists():
-    die("sendEmail.py not found in the same directory as deadman.py. Please ensure sendEmail.py is present.")
-
 parser = argparse.ArgumentParser(
     description="Local-only dead man's switch",
     epilog="Examples:\n"
@@ -205,9 +245,11 @@ if args.command == "setup":
 if args.command == 'check':
     BASE = Path.home() / ".deadman" / args.id
     CONFIG_FILE = BASE / "config.json"
-    if not CONFIG_FILE.exists():
+    # Runs every 5 minutes from cron: just read, rather than stat then read
+    try:
+        config = json.loads(CONFIG_FILE.read_text())
+    except FileNotFoundError:
         die(f"Config not found for id {args.id}")
-    config = json.loads(CONFIG_FILE.read_text())
     RESET_FILE = Path(config["reset"])
     last = int(RESET_FILE.read_text())
     now = int(time.time())
@@ -253,7 +295,7 @@ CONFIG_FILE = BASE / "config.json"
 for d in (KEY_DIR, DATA_DIR, SCRIPT_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
-deps = ["gpg", "shred", "cron"]
+deps = ["gpg", "cron"]
 missing = [d for d in deps if not shutil.which(d)]
 if missing:
     print("Missing dependencies:", ", ".join(missing))
@@ -288,20 +330,10 @@ run(["gpg", "--batch", "--gen-key", str(param_file)])
 
 pub_key = KEY_DIR / "public.asc"
 priv_key = KEY_DIR / "private.asc"
-
-with open(pub_key, "w") as f:
-    subprocess.run(["gpg", "--armor", "--export", key_email], stdout=f)
-
-with open(priv_key, "w") as f:
-    subprocess.run(["gpg", "--armor", "--export-secret-keys", key_email], stdout=f)
-
-print("\n[IMPORTANT]")
-print(f"Private key file: {priv_key}")
-print("You MUST copy this securely for the recipient.")
-input("Press ENTER once copied and verified...")
-
 instruction = DATA_DIR / "HOW_TO_DECRYPT.txt"
-instruction.write_text("""
+payload_enc = DATA_DIR / "message.asc"
+
+instruction_text = """
 HOW TO DECRYPT THIS MESSAGE
 
 You should have received:
@@ -421,16 +453,33 @@ Once you have saved the message safely,
 you may delete private.asc if instructed to do so.
 
 For additional help, try google: How to decrypt a message with GPG
-""")
-
-payload_enc = DATA_DIR / "message.asc"
+"""
+
+def export_key(option, dest):
+    with open(dest, "w") as f:
+        subprocess.run(["gpg", "--armor", option, key_email], stdout=f)
+
+# Once the key is in the keyring, the two exports, the encryption and writing
+# the instructions don't depend on each other, so they run side by side.
+with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+    jobs = [
+        pool.submit(export_key, "--export", pub_key),
+        pool.submit(export_key, "--export-secret-keys", priv_key),
+        pool.submit(run, [
+            "gpg", "--armor", "--encrypt",
+            "--recipient", key_email,
+            "--output", str(payload_enc),
+            str(secret_file)
+        ]),
+        pool.submit(instruction.write_text, instruction_text),
+    ]
+    for job in jobs:
+        job.result()
 
-run([
-    "gpg", "--armor", "--encrypt",
-    "--recipient", key_email,
-    "--output", str(payload_enc),
-    str(secret_file)
-])
+print("\n[IMPORTANT]")
+print(f"Private key file: {priv_key}")
+print("You MUST copy this securely for the recipient.")
+input("Press ENTER once copied and verified...")
 
 print("GMAIL API SETUP REQUIRED")
 print("Follow: https://developers.google.com/workspace/gmail/api/quickstart/python")
@@ -439,27 +488,19 @@ print(BASE)
 input("Press ENTER once credentials.json is ready and you have authenticated...")
 
 if confirm("Shred private key now? This is irreversible."):
-    run(["shred", "-vzu", "-n", "5", str(priv_key)])
-    priv_key.unlink(missing_ok=True)
+    shred_file(priv_key)
 else:
     die("Private key must be destroyed before proceeding")
 
 if confirm("Shred original secret file? (recommended)"):
-    run(["shred", "-vzu", "-n", "5", str(secret_file)])
-    secret_file.unlink(missing_ok=True)
+    shred_file(secret_file)
 
 RESET_FILE.write_text(str(int(time.time())))
 
 cron_tag = f"DEADMAN_{switch_id}"
 deadman_script = Path(__file__).resolve()
 cron_line = f"*/5 * * * * bash -c 'source {venv_path}/bin/activate && python3 {deadman_script} check -i {switch_id}' # {cron_tag}"
-
-existing = subprocess.run(["crontab", "-l"], capture_output=True, text=True).stdout
-lines = [l for l in existing.splitlines() if cron_tag not in l]
-lines.append(cron_line)
-
-p = subprocess.Popen(["crontab", "-"], stdin=subprocess.PIPE, text=True)
-p.communicate("\n".join(lines) + "\n")
+update_crontab(cron_tag, cron_line)
 
 CONFIG_FILE.write_text(json.dumps({
     "id": switch_id,
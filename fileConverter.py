@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
+import os
 import subprocess
 import shutil
 import sys
+import argparse
+import tempfile
+import concurrent.futures
+import contextlib
+import functools
 import mimetypes
 from pathlib import Path
 from collections import deque
@@ -17,12 +23,16 @@ EXTENSION_MIME_OVERRIDES = {
     "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
 }
 
+# Every input, and the output extension, goes through guess_type; the cache
+# answers repeats (batches of the same file type) without re-scanning the maps.
+_guess_type = functools.lru_cache(maxsize=256)(mimetypes.guess_type)
+
 def mime_from_extension(ext: str) -> str:
     ext = ext.lower().lstrip(".")
     if ext in EXTENSION_MIME_OVERRIDES:
         return EXTENSION_MIME_OVERRIDES[ext]
 
-    mime, _ = mimetypes.guess_type(f"file.{ext}")
+    mime, _ = _guess_type(f"file.{ext}")
     if not mime:
         raise ValueError(f"Unknown output extension: .{ext}")
     return mime
@@ -58,6 +68,9 @@ TOOLS = {
     "soffice": {
         "bin": "soffice",
         "install": "sudo apt install libreoffice",
+        # soffice instances sharing a user profile hand their work to whichever
+        # one started first, so concurrent jobs each get a throwaway profile
+        "private_profile": True,
         "conversions": {
             ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/pdf"):
                 lambda s, d: ["soffice", "--headless", "--convert-to", "pdf", "--outdir", d, s],
@@ -83,7 +96,15 @@ def have(binname):
     return shutil.which(binname) is not None
 
 def mime(path):
-    return mimetypes.guess_type(path)[0]
+    return _guess_type(path)[0]
+
+def remove_intermediate(path):
+    # Intermediates are files, or an output directory for tools like soffice
+    p = Path(path)
+    if p.is_dir():
+        shutil.rmtree(p, ignore_errors=True)
+    elif p.exists():
+        p.unlink()
 
 def require_tool(tool):
     if not have(tool["bin"]):
@@ -96,11 +117,18 @@ def require_tool(tool):
 # ----------------------------
 
 def build_graph():
+    # Adjacency list for the BFS plus a (src, dst) -> (tool, cmd_fn) index.
+    # The first tool registered for a pair wins, as with the old linear scan.
     graph = {}
+    index = {}
     for tool in TOOLS.values():
-        for (src, dst) in tool["conversions"]:
+        for (src, dst), cmd_fn in tool["conversions"].items():
             graph.setdefault(src, []).append(dst)
-    return graph
+            index.setdefault((src, dst), (tool, cmd_fn))
+    return graph, index
+
+# TOOLS is static, so both are built once at import
+GRAPH, CONV_INDEX = build_graph()
 
 def find_path(start, goal, graph):
     q = deque([(start, [])])
@@ -118,23 +146,19 @@ def find_path(start, goal, graph):
     return None
 
 def find_tool(src, dst):
-    for tool in TOOLS.values():
-        if (src, dst) in tool["conversions"]:
-            return tool, tool["conversions"][(src, dst)]
-    return None, None
+    return CONV_INDEX.get((src, dst), (None, None))
 
 # ----------------------------
 # Execution
 # ----------------------------
 
 def convert(src, target_mime, out_prefix):
-    graph = build_graph()
     src_mime = mime(src)
 
     if not src_mime:
         raise RuntimeError("Unknown source MIME type")
 
-    path = find_path(src_mime, target_mime, graph)
+    path = find_path(src_mime, target_mime, GRAPH)
     if not path:
         raise RuntimeError(f"No conversion path from {src_mime} → {target_mime}")
 
@@ -147,24 +171,71 @@ def convert(src, target_mime, out_prefix):
         out = out_prefix if i == len(path) - 2 else f"{out_prefix}.tmp{i}"
         cmd = cmd_fn(current, out)
 
-        print("RUN:", " ".join(cmd))
-        subprocess.run(cmd, check=True)
-
+        # Only soffice hops need a scratch profile directory
+        scratch = (tempfile.TemporaryDirectory(prefix="fileConverter-")
+                   if tool.get("private_profile") else contextlib.nullcontext())
+        with scratch as profile:
+            if profile:
+                cmd.insert(1, f"-env:UserInstallation={Path(profile).as_uri()}")
+            print("RUN:", " ".join(cmd))
+            subprocess.run(cmd, check=True)
+
+        # Hops hand over through a file rather than a pipe: the only multi-hop
+        # chain in TOOLS is docx -> pdf -> image, and soffice can only write
+        # into --outdir, never to stdout.
+        # Drop the previous hop's output as soon as it has been consumed so at
+        # most one intermediate is on disk at a time
+        if i > 0:
+            remove_intermediate(current)
         current = out
 
 # ----------------------------
 # CLI
 # ----------------------------
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: fileConverter.py <input> <output-extension> <output-prefix>")
-        print("Example: fileConverter.py file.pdf png page")
-        sys.exit(1)
+def output_prefixes(inputs, out_prefix):
+    # With several inputs each one gets its own prefix: <prefix>-<input stem>.
+    # Inputs sharing a stem (a/x.pdf, b/x.pdf) are numbered, <prefix>-x-2, so
+    # no two conversions write to the same files.
+    if len(inputs) == 1:
+        return [out_prefix]
+    used, prefixes = set(), []
+    for src in inputs:
+        stem = name = Path(src).stem
+        n = 1
+        while name in used:
+            n += 1
+            name = f"{stem}-{n}"
+        used.add(name)
+        prefixes.append(f"{out_prefix}-{name}")
+    return prefixes
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert files by chaining external tools.",
+        epilog="Example: fileConverter.py file.pdf png page\n"
+               "         fileConverter.py -j 4 a.pdf b.pdf png page   (-> page-a*, page-b*)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("inputs", nargs="+", help="Input file(s)")
+    parser.add_argument("ext", help="Output extension")
+    parser.add_argument("out_prefix", help="Output prefix")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Files converted concurrently (default: CPU count)")
+    args = parser.parse_args()
+
+    target_mime = mime_from_extension(args.ext)
+    prefixes = output_prefixes(args.inputs, args.out_prefix)
+
+    # Each conversion is a chain of external processes, so threads are enough
+    # to keep several chains running side by side.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = [
+            executor.submit(convert, src, target_mime, prefix)
+            for src, prefix in zip(args.inputs, prefixes)
+        ]
+        for future in futures:
+            future.result()
 
-    src = sys.argv[1]
-    ext = sys.argv[2]
-    out_prefix = sys.argv[3]
-
-    target_mime = mime_from_extension(ext)
-    convert(src, target_mime, out_prefix)
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,27 @@ import argparse
 from PIL import Image, ImageDraw
 
 
+def has_alpha(img):
+    return "A" in img.getbands() or "transparency" in img.info
+
+
 def merge_images(img1_path, img2_path, output_path, direction):
-    img1 = Image.open(img1_path).convert("RGBA")
-    img2 = Image.open(img2_path).convert("RGBA")
+    img1 = Image.open(img1_path)
+    img2 = Image.open(img2_path)
+
+    # Only pay for a 4-channel buffer when an input actually carries alpha;
+    # opaque inputs (e.g. JPEGs) are merged as plain RGB.
+    mode = "RGBA" if has_alpha(img1) or has_alpha(img2) else "RGB"
+    img1 = img1.convert(mode)
+    img2 = img2.convert(mode)
 
-    img2 = img2.resize(img1.size)
+    if img2.size != img1.size:
+        img2 = img2.resize(img1.size, Image.Resampling.BILINEAR, reducing_gap=2.0)
     w, h = img1.size
 
-    # Create mask
-    mask = Image.new("L", (w, h), 0)
+    # Create mask. It is strictly binary, so a 1-bit mask lets paste copy the
+    # img1 triangle over img2 as-is instead of alpha-blending every pixel.
+    mask = Image.new("1", (w, h), 0)
     draw = ImageDraw.Draw(mask)
 
     if direction == "tl-br":  
@@ -23,8 +35,8 @@ def merge_images(img1_path, img2_path, output_path, direction):
     else:
         raise ValueError("Invalid direction")
 
-    result = Image.composite(img1, img2, mask)
-    result.save(output_path)
+    img2.paste(img1, mask=mask)
+    img2.save(output_path)
     print(f"Saved merged image → {output_path}")
 
 
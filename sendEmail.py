@@ -4,28 +4,47 @@
 # GMAIL API SETUP REQUIRED
 # Follow: https://developers.google.com/workspace/gmail/api/quickstart/python
 # Usage: python3 sendEmail.py -c path/to/credentials.json -t recipient@example.com -s "Subject" -m "Body of the email" --cc "cc1@example.com,cc2@example.com" --bcc "bcc1@example.com,bcc2@example.com" -a file1.txt file2.pdf
+# Add --separate to send every -t recipient (comma-separated) their own copy, authenticating only once;
+# --cc/--bcc recipients are added to the first copy only, so they receive the email once
 # token.json cannot be re-used in other machines, need fresh authentication using credentials.json
 
 import os
 import base64
 import argparse
+import itertools
+import functools
+import secrets
+import tempfile
 import mimetypes
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
+from email.generator import BytesGenerator
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
+BATCH_LIMIT = 100  # Gmail API maximum sub-requests per batch HTTP request
+SPOOL_MAX_SIZE = 16 * 1024 * 1024  # messages above this are spooled to disk, not memory
+RESUMABLE_THRESHOLD = 1024 * 1024  # smaller messages go up in one multipart request
+B64_CHUNK = 57 * 1024  # attachment bytes read per step; multiple of 57 -> whole 76-char base64 lines
 
-print("[i] For authentication in ssh/headless environments, note the port number in the URL: redirect_uri=http%3A%2F%2Flocalhost%3A49651...")
-print("[i] Then run ssh -i ~/.ssh/id_ed25519 -N -L 49651:localhost:49651 ubuntu@<vps_ip>")
+# Bulk sends usually attach the same files to every message, so repeat lookups
+# for a path are answered from the cache.
+_guess_type = functools.lru_cache(maxsize=256)(mimetypes.guess_type)
 
 def get_gmail_service(credentials_path):
-    credentials_path = os.path.abspath(credentials_path)
+    return _get_gmail_service(os.path.abspath(credentials_path))
+
+# Cached per credentials file: building the client is the slow part of a small
+# send, so repeated calls in one process reuse it.
+@functools.lru_cache(maxsize=4)
+def _get_gmail_service(credentials_path):
     creds = None
     token_path = os.path.join(os.path.dirname(credentials_path), 'token.json')
     if os.path.exists(token_path):
@@ -34,11 +53,16 @@ def get_gmail_service(credentials_path):
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
+            print("[i] For authentication in ssh/headless environments, note the port number in the URL: redirect_uri=http%3A%2F%2Flocalhost%3A49651...")
+            print("[i] Then run ssh -i ~/.ssh/id_ed25519 -N -L 49651:localhost:49651 ubuntu@<vps_ip>")
             flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
             creds = flow.run_local_server(open_browser=False, port=0)
         with open(token_path, 'w') as token:
             token.write(creds.to_json())
-    return build('gmail', 'v1', credentials=creds)
+    # google-api-python-client >= 2.0 already builds from its bundled discovery
+    # document; cache_discovery=False also skips probing for the legacy
+    # discovery cache (an import attempt and a warning on every run).
+    return build('gmail', 'v1', credentials=creds, cache_discovery=False)
 
 def create_message(sender, to, subject, message_text, attachment_paths=None, cc=None, bcc=None):
     # If multiple emails, join them into comma-separated strings
@@ -65,7 +89,7 @@ def create_message(sender, to, subject, message_text, attachment_paths=None, cc=
             with open(attachment_path, 'rb') as f:
                 file_data = f.read()
             filename = os.path.basename(attachment_path)
-            content_type, _ = mimetypes.guess_type(attachment_path)
+            content_type, _ = _guess_type(attachment_path)
             if content_type:
                 main_type, sub_type = content_type.split('/', 1)
                 attachment = MIMEBase(main_type, sub_type)
@@ -84,20 +108,110 @@ def create_message(sender, to, subject, message_text, attachment_paths=None, cc=
             message['bcc'] = bcc_header
     return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
 
+def _write_headers(fh, part):
+    for name, value in part.items():
+        fh.write(part.policy.fold_binary(name, value))
+    fh.write(b"\n")
+
+def write_message(fh, sender, to, subject, message_text, attachment_paths=None, cc=None, bcc=None):
+    # Same message as create_message, serialized straight into the binary file
+    # fh. Attachments are base64-encoded from disk B64_CHUNK at a time, so no
+    # attachment (or the message as a whole) is ever held in memory.
+    cc_header = ",".join(cc) if isinstance(cc, list) else cc
+    bcc_header = ",".join(bcc) if isinstance(bcc, list) else bcc
+    text_part = MIMEText(message_text)
+
+    if not attachment_paths:
+        message = text_part
+    else:
+        boundary = f"==============={secrets.token_hex(16)}=="
+        message = MIMEMultipart(boundary=boundary)
+    message['to'], message['from'], message['subject'] = to, sender, subject
+    if cc_header:
+        message['cc'] = cc_header
+    if bcc_header:
+        message['bcc'] = bcc_header
+    if not attachment_paths:
+        BytesGenerator(fh).flatten(message)
+        return
+
+    attachment_paths = [os.path.abspath(p) for p in attachment_paths]
+    for attachment_path in attachment_paths:
+        if not os.path.exists(attachment_path):
+            raise FileNotFoundError(f"Attachment file not found: {attachment_path}")
+
+    _write_headers(fh, message)
+    fh.write(f"--{boundary}\n".encode())
+    BytesGenerator(fh).flatten(text_part)
+    for attachment_path in attachment_paths:
+        content_type, _ = _guess_type(attachment_path)
+        main_type, sub_type = content_type.split('/', 1) if content_type else ('application', 'octet-stream')
+        attachment = MIMEBase(main_type, sub_type)
+        attachment['Content-Transfer-Encoding'] = 'base64'
+        attachment.add_header('Content-Disposition', f'attachment; filename="{os.path.basename(attachment_path)}"')
+        fh.write(f"\n--{boundary}\n".encode())
+        _write_headers(fh, attachment)
+        with open(attachment_path, 'rb') as f:
+            while chunk := f.read(B64_CHUNK):
+                fh.write(base64.encodebytes(chunk))
+    fh.write(f"\n--{boundary}--\n".encode())
+
 def send_email(service, sender, to, subject, message_text, attachment_paths=None, cc=None, bcc=None):
-    message = create_message(sender, to, subject, message_text, attachment_paths, cc, bcc)
-    sent_message = service.users().messages().send(userId='me', body=message).execute()
+    # Upload the message as message/rfc822 media rather than as a base64 'raw'
+    # field, so large attachments never sit in memory twice. Only messages past
+    # RESUMABLE_THRESHOLD pay for a resumable session (an extra round trip).
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as fh:
+        write_message(fh, sender, to, subject, message_text, attachment_paths, cc, bcc)
+        resumable = fh.tell() > RESUMABLE_THRESHOLD
+        fh.seek(0)
+        media = MediaIoBaseUpload(fh, mimetype='message/rfc822', resumable=resumable)
+        sent_message = service.users().messages().send(userId='me', body={}, media_body=media).execute()
     print(f"Email sent! Message ID: {sent_message['id']}")
 
+def send_emails_bulk(service, messages):
+    # Send many create_message() bodies with one HTTPS round trip per BATCH_LIMIT
+    # messages instead of one per message. Sub-requests that fail inside a batch
+    # are retried once on their own; one that fails again is reported and
+    # skipped so the IDs already sent are still returned.
+    messages = list(messages)  # retries look bodies up by index
+    sent, failed = [], []
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            failed.append(int(request_id))
+        else:
+            sent.append(response['id'])
+            print(f"Email sent! Message ID: {response['id']}")
+
+    numbered = enumerate(messages)
+    while chunk := list(itertools.islice(numbered, BATCH_LIMIT)):
+        batch = service.new_batch_http_request(callback=on_response)
+        for i, message in chunk:
+            batch.add(service.users().messages().send(userId='me', body=message), request_id=str(i))
+        batch.execute()
+
+    for i in failed:
+        try:
+            sent_message = service.users().messages().send(userId='me', body=messages[i]).execute()
+        except HttpError as e:
+            print(f"Failed to send email {i + 1} of {len(messages)}: {e}")
+            continue
+        sent.append(sent_message['id'])
+        print(f"Email sent on retry! Message ID: {sent_message['id']}")
+    return sent
+
 def main():
     parser = argparse.ArgumentParser(description="Send email via Gmail API", add_help=True)
     parser.add_argument("-c", "--credentials", required=True, help="Path to credentials.json file")
-    parser.add_argument("-t", "--to", required=True, help="Recipient's email")
+    parser.add_argument("-t", "--to", required=True, help="Recipient's email (comma-separated for several)")
     parser.add_argument("-s", "--subject", required=True, help="Email subject")
     parser.add_argument("-m", "--message", required=True, help="Email body")
     parser.add_argument("-a", "--attachment", nargs='*', help="Path(s) to attachment file(s) (optional)")
     parser.add_argument("--cc", help="CC recipient(s), comma-separated")
     parser.add_argument("--bcc", help="BCC recipient(s), comma-separated")
+    parser.add_argument("--separate", action="store_true",
+                        help="Send each --to recipient their own copy instead of one shared email "
+                             "(--cc/--bcc are added to the first copy only)")
     args = parser.parse_args()
 
     # Convert CC/BCC to list
@@ -111,17 +225,31 @@ def main():
     if not os.path.exists(args.credentials):
         raise FileNotFoundError(f"Credentials file not found: {args.credentials}")
 
+    # Authenticate once; every send below reuses the same service
     service = get_gmail_service(args.credentials)
-    send_email(
-        service,
-        'me',
-        args.to,
-        args.subject,
-        args.message,
-        attachment_paths=args.attachment,
-        cc=cc_list,
-        bcc=bcc_list
-    )
+    recipients = [e.strip() for e in args.to.split(",") if e.strip()] if args.separate else [args.to]
+    # CC/BCC ride along on the first copy only; adding them to every copy
+    # would send each of them one email per --to recipient
+    copies = [(to, cc_list, bcc_list) if i == 0 else (to, None, None) for i, to in enumerate(recipients)]
+    if len(copies) > 1 and not args.attachment:
+        # Small text-only copies: one batch request per BATCH_LIMIT recipients
+        send_emails_bulk(service, [
+            create_message('me', to, args.subject, args.message, cc=cc, bcc=bcc)
+            for to, cc, bcc in copies
+        ])
+        return
+    # With attachments each copy is streamed on its own (see send_email)
+    for to, cc, bcc in copies:
+        send_email(
+            service,
+            'me',
+            to,
+            args.subject,
+            args.message,
+            attachment_paths=args.attachment,
+            cc=cc,
+            bcc=bcc
+        )
 
 if __name__ == '__main__':
     main()
@@ -12,93 +12,242 @@
 """
 
 import os
+import re
 import sys
 import shutil
 import subprocess
 import socket
+import shlex
+import ipaddress
+import hashlib
+import zipfile
 import argparse
-import time
+import threading
+import concurrent.futures
 from pathlib import Path
-from urllib.request import urlretrieve
+from urllib.request import Request, urlopen, urlretrieve
 
 
 SDK_ZIP_URL = "https://dl.google.com/android/repository/commandlinetools-linux-11076708_latest.zip"
+SDK_ZIP_SHA256 = "2d2d50857e4eb553af5a6dc3ad507a17adf43d115264b1afc116f95c92e5e258"
+SDK_CACHE_DIR = Path.home() / ".cache" / "android-sdk"
+SDK_ZIP_PATH = SDK_CACHE_DIR / f"cmdline-tools-{SDK_ZIP_SHA256}.zip"
+DOWNLOAD_SEGMENTS = 8               # parallel ranged connections per download
+DOWNLOAD_MIN_SEGMENT = 1024 * 1024  # don't split files into pieces smaller than this
+DOWNLOAD_CHUNK = 1024 * 1024
+DOWNLOAD_ABORT = threading.Event()  # set when the script bails out mid-download
 SDK_ROOT = Path.home() / "Android" / "Sdk"
 CMDLINE_DIR = SDK_ROOT / "cmdline-tools" / "latest"
 SDKMANAGER_PATH = CMDLINE_DIR / "bin" / "sdkmanager"
 AVDMANAGER_PATH = CMDLINE_DIR / "bin" / "avdmanager"
 AVD_NAME = "android_emulator_36"
 IMAGE_NAME = "system-images;android-36;google_apis_playstore;x86_64"
-
-JAVA_PACKAGES = ["openjdk-17-jdk", "openjdk-17-jre"]
+BOOT_TIMEOUT = 300  # seconds to wait for sys.boot_completed
+BASHRC_MARKER = "# Android SDK setup"
+SDK_LICENSES = ("android-sdk-license", "android-sdk-preview-license")
+SDKMANAGER_JAVA_OPTS = "-XX:+UseSerialGC -Xmx512m"
+PORT_PROBE_TIMEOUT = 0.2  # proxy reachability check; only decides whether to warn
+DEFAULT_PROXY_PORT = 8080
+HOSTNAME_RE = re.compile(r"(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*")
+
+# sdkmanager/avdmanager only need a headless JDK (it pulls in the JRE itself).
+# The emulator talks to KVM directly, so no virt-manager GUI or bridge-utils.
+JAVA_PACKAGES = ["openjdk-17-jdk-headless"]
+JVM_DIR = "/usr/lib/jvm"
+JAVA_HOME_CANDIDATES = ("java-17-openjdk-amd64", "java-11-openjdk-amd64", "default-java")
 
 REQUIRED_DEPS = [
     "qemu-kvm",
     "libvirt-daemon-system",
     "libvirt-clients",
-    "bridge-utils",
-    "virt-manager",
     "wget",
-    "unzip",
     "curl"
 ] + JAVA_PACKAGES
 
 
-def run(cmd, check=True, env=None):
-    print(f"\n[+] Running: {cmd}")
-    result = subprocess.run(cmd, shell=True, text=True, env=env)
+def run(argv, check=True, env=None, input=None):
+    # argv is run directly, without a /bin/sh in between; input replaces the
+    # old `yes | ...` / `echo no | ...` pipes
+    argv = [str(a) for a in argv]
+    shown = " ".join(argv)
+    print(f"\n[+] Running: {shown}")
+    result = subprocess.run(argv, text=True, env=env, input=input)
     if check and result.returncode != 0:
-        sys.exit(f"[-] Command failed with exit code {result.returncode}: {cmd}")
+        sys.exit(f"[-] Command failed with exit code {result.returncode}: {shown}")
     return result
 
 
+def installed_packages():
+    out = subprocess.run(
+        ["dpkg-query", "-W", "-f=${Package}\t${db:Status-Status}\n"],
+        capture_output=True, text=True
+    ).stdout
+    return {name for name, _, status in (l.partition("\t") for l in out.splitlines()) if status == "installed"}
+
+
 def ensure_dependencies():
     print("\n[+] Checking and installing dependencies...")
-    run("sudo apt update -y")
-    installed = subprocess.run("dpkg -l", shell=True, text=True, capture_output=True).stdout
-    missing = [pkg for pkg in REQUIRED_DEPS if pkg not in installed]
+    installed = installed_packages()
+    missing = [pkg for pkg in REQUIRED_DEPS if pkg.split(":")[0] not in installed]
     if missing:
         print(f"[+] Installing missing dependencies: {' '.join(missing)}")
-        run(f"sudo apt install -y {' '.join(missing)}")
+        # Package lists only need refreshing when something is about to be installed
+        run(["sudo", "apt-get", "update", "-y"])
+        run(["sudo", "apt-get", "install", "-y", "--no-install-recommends", *missing])
     else:
         print("[+] All required packages already installed.")
 
 
+def java_version(name):
+    # "java-21-openjdk-amd64" -> 21; anything unparsable sorts last
+    version = name.split("-")[1] if name.count("-") >= 2 else ""
+    return int(version) if version.isdigit() else 0
+
+
 def ensure_java_home():
-    candidates = [
-        "/usr/lib/jvm/java-17-openjdk-amd64",
-        "/usr/lib/jvm/java-11-openjdk-amd64",
-        "/usr/lib/jvm/default-java"
-    ]
-    for c in candidates:
-        if Path(c).exists():
-            os.environ["JAVA_HOME"] = c
-            print(f"[+] JAVA_HOME set to {c}")
-            return c
+    # One listing of JVM_DIR instead of a stat per candidate. Known names keep
+    # their priority; any other installed OpenJDK (e.g. 21) is used after them.
+    try:
+        with os.scandir(JVM_DIR) as it:
+            installed = {e.name: e.path for e in it if e.is_dir()}
+    except FileNotFoundError:
+        installed = {}
+    others = sorted(
+        (n for n in installed if n.startswith("java-") and "openjdk" in n and n not in JAVA_HOME_CANDIDATES),
+        key=java_version, reverse=True
+    )
+    for name in [n for n in JAVA_HOME_CANDIDATES if n in installed] + others:
+        c = installed[name]
+        os.environ["JAVA_HOME"] = c
+        print(f"[+] JAVA_HOME set to {c}")
+        return c
     sys.exit("[-] Java not found after installation.")
 
 
-def ensure_cmdline_tools():
+def download(url, dest):
+    # Segmented download: several TCP streams get around per-connection
+    # throttling on slow CDN paths. Prefer aria2c; otherwise fetch byte ranges
+    # on a thread pool straight into their offsets of a preallocated file.
+    # Every path checks DOWNLOAD_ABORT so a failing or interrupted main() is
+    # not held up at exit by a download nobody will use.
+    if shutil.which("aria2c"):
+        argv = ["aria2c", f"-x{DOWNLOAD_SEGMENTS}", f"-s{DOWNLOAD_SEGMENTS}", "--min-split-size=1M",
+                "--allow-overwrite=true", "--auto-file-renaming=false",
+                "-d", str(dest.parent), "-o", dest.name, url]
+        print(f"\n[+] Running: {' '.join(argv)}")
+        proc = subprocess.Popen(argv)
+        while proc.poll() is None:
+            if DOWNLOAD_ABORT.wait(0.2):
+                proc.terminate()
+                proc.wait()
+                raise OSError(f"Download of {url} aborted")
+        if proc.returncode != 0:
+            sys.exit(f"[-] Command failed with exit code {proc.returncode}: {' '.join(argv)}")
+        return
+    with urlopen(Request(url, method="HEAD")) as r:
+        size = int(r.headers.get("Content-Length") or 0)
+        ranged = r.headers.get("Accept-Ranges") == "bytes"
+    if not ranged or size < 2 * DOWNLOAD_MIN_SEGMENT:
+        def check_abort(*_):
+            if DOWNLOAD_ABORT.is_set():
+                raise OSError(f"Download of {url} aborted")
+        urlretrieve(url, dest, reporthook=check_abort)
+        return
+
+    segment = max(DOWNLOAD_MIN_SEGMENT, -(-size // DOWNLOAD_SEGMENTS))
+    fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    def fetch(start):
+        end = min(start + segment, size) - 1
+        with urlopen(Request(url, headers={"Range": f"bytes={start}-{end}"})) as r:
+            if r.status != 206:
+                raise OSError(f"Server ignored range request for {url}")
+            offset = start
+            # read1 returns what has arrived, so an abort is noticed promptly
+            while chunk := r.read1(DOWNLOAD_CHUNK):
+                if DOWNLOAD_ABORT.is_set():
+                    raise OSError(f"Download of {url} aborted")
+                offset += os.pwrite(fd, chunk, offset)
+        if offset != end + 1:
+            raise OSError(f"Short read for bytes {start}-{end} of {url}")
+
+    try:
+        os.ftruncate(fd, size)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=DOWNLOAD_SEGMENTS) as pool:
+            list(pool.map(fetch, range(0, size, segment)))
+    finally:
+        os.close(fd)
+
+
+def sha256_file(path):
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        while chunk := f.read(DOWNLOAD_CHUNK):
+            h.update(chunk)
+        return h.hexdigest()
+
+
+def download_cmdline_tools():
+    # The zip is kept in SDK_CACHE_DIR and reused on re-runs as long as its
+    # SHA-256 still matches; only a missing or corrupt copy is downloaded.
+    if SDK_ZIP_PATH.exists() and sha256_file(SDK_ZIP_PATH) == SDK_ZIP_SHA256:
+        print(f"[+] Using cached command-line tools from {SDK_ZIP_PATH}")
+        return SDK_ZIP_PATH
+    print("[+] Downloading Android command-line tools...")
+    SDK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    part = SDK_ZIP_PATH.with_name(SDK_ZIP_PATH.name + ".part")
+    download(SDK_ZIP_URL, part)
+    if sha256_file(part) != SDK_ZIP_SHA256:
+        part.unlink(missing_ok=True)
+        sys.exit(f"[-] Checksum mismatch for {SDK_ZIP_URL}")
+    os.replace(part, SDK_ZIP_PATH)
+    return SDK_ZIP_PATH
+
+
+def ensure_cmdline_tools(download=None):
+    # download: optional future from download_cmdline_tools() started earlier
     if SDKMANAGER_PATH.exists():
         print(f"[+] Command-line tools already installed at {CMDLINE_DIR}")
         return
-    print("[+] Downloading Android command-line tools...")
     SDK_ROOT.mkdir(parents=True, exist_ok=True)
-    zip_path = Path("/tmp/cmdline-tools.zip")
-    urlretrieve(SDK_ZIP_URL, zip_path)
-    temp_extract = SDK_ROOT / "cmdline-tools-temp"
-    if temp_extract.exists():
-        shutil.rmtree(temp_extract)
-    temp_extract.mkdir(parents=True, exist_ok=True)
-    run(f"unzip -o {zip_path} -d {temp_extract}")
-    inner = next(temp_extract.iterdir())
-    CMDLINE_DIR.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(str(inner), CMDLINE_DIR)
-    shutil.rmtree(temp_extract)
-    zip_path.unlink(missing_ok=True)
-    for tool in CMDLINE_DIR.glob("**/*"):
-        if tool.is_file():
-            tool.chmod(tool.stat().st_mode | 0o111)
+    zip_path = download.result() if download else download_cmdline_tools()
+    # Extract into a sibling and rename it into place at the end, so an
+    # interrupted install never leaves a half-filled CMDLINE_DIR whose
+    # sdkmanager would make the next run skip this step.
+    new_dir = CMDLINE_DIR.with_suffix(".new")
+    old_dir = CMDLINE_DIR.with_suffix(".old")
+    shutil.rmtree(new_dir, ignore_errors=True)  # leftover from an interrupted run
+    # Everything in the zip sits under a top-level cmdline-tools/ directory;
+    # dropping that component extracts straight into place, with no unzip
+    # process or move afterwards.
+    with zipfile.ZipFile(zip_path) as z:
+        for info in z.infolist():
+            rel = info.filename.partition("/")[2]
+            if not rel:
+                continue
+            dest = new_dir / rel
+            if info.is_dir():
+                dest.mkdir(parents=True, exist_ok=True)
+                continue
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with z.open(info) as src, open(dest, "wb") as dst:
+                shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK)
+            mode = info.external_attr >> 16 & 0o777
+            if mode:
+                dest.chmod(mode)
+    # Only the launchers in bin/ need to be executable; set the mode outright
+    # rather than stat-ing every file in the tree to OR in the x bits
+    with os.scandir(new_dir / "bin") as it:
+        for entry in it:
+            if entry.is_file():
+                os.chmod(entry.path, 0o755)
+    if CMDLINE_DIR.exists():
+        shutil.rmtree(old_dir, ignore_errors=True)
+        CMDLINE_DIR.rename(old_dir)
+    new_dir.rename(CMDLINE_DIR)
+    shutil.rmtree(old_dir, ignore_errors=True)
     print(f"[+] Installed command-line tools to {CMDLINE_DIR}")
 
 
@@ -108,11 +257,18 @@ def setup_env():
         f'export PATH="$PATH:{CMDLINE_DIR}/bin:{SDK_ROOT}/platform-tools:{SDK_ROOT}/emulator"'
     ]
     bashrc = Path.home() / ".bashrc"
-    with bashrc.open("a") as f:
-        f.write("\n# Android SDK setup\n")
-        f.write("\n".join(env_lines) + "\n")
     os.environ["ANDROID_SDK_ROOT"] = str(SDK_ROOT)
     os.environ["PATH"] += f":{CMDLINE_DIR}/bin:{SDK_ROOT}/platform-tools:{SDK_ROOT}/emulator"
+    try:
+        already = BASHRC_MARKER in bashrc.read_text()
+    except FileNotFoundError:
+        already = False
+    if already:
+        print("[+] Environment already configured in ~/.bashrc")
+        return
+    with bashrc.open("a") as f:
+        f.write(f"\n{BASHRC_MARKER}\n")
+        f.write("\n".join(env_lines) + "\n")
     print("[+] Environment configured (added to ~/.bashrc)")
 
 
@@ -120,12 +276,26 @@ def install_sdk_components():
     sdkmanager = str(SDKMANAGER_PATH)
     if not Path(sdkmanager).exists():
         sys.exit("[-] sdkmanager not found.")
-    print("[+] Accepting licenses...")
-    run(f"yes | {sdkmanager} --licenses")
-    print("[+] Updating sdkmanager...")
-    run(f"{sdkmanager} --update")
+    # Short-lived JVM: serial GC and a capped heap start faster than the defaults
+    env = dict(os.environ, JAVA_OPTS=f"{SDKMANAGER_JAVA_OPTS} {os.environ.get('JAVA_OPTS', '')}".strip())
+    licenses_dir = SDK_ROOT / "licenses"
+    licensed = all((licenses_dir / name).exists() for name in SDK_LICENSES)
+    if licensed:
+        print("[+] Licenses already accepted.")
+    else:
+        print("[+] Accepting licenses...")
+        run([sdkmanager, "--licenses"], env=env, input="y\n" * 100)
+    # A single install call fetches the repository index once; it installs the
+    # latest revision of each package, so no separate --update pass is needed.
     print("[+] Installing Android SDK components...")
-    run(f"{sdkmanager} 'platform-tools' 'emulator' 'platforms;android-36' '{IMAGE_NAME}'")
+    install = [sdkmanager, "platform-tools", "emulator", "platforms;android-36", IMAGE_NAME]
+    # Empty stdin: a license prompt we skipped reads EOF and the install fails
+    # straight into the retry below instead of waiting on the terminal
+    if run(install, check=not licensed, env=env, input="").returncode != 0:
+        # Skipped the prompt but a package wanted a license we don't have yet
+        print("[+] Install failed; accepting licenses and retrying...")
+        run([sdkmanager, "--licenses"], env=env, input="y\n" * 100)
+        run(install, env=env, input="")
 
 
 def create_avd():
@@ -134,18 +304,24 @@ def create_avd():
         print(f"[+] AVD '{AVD_NAME}' already exists.")
         return
     print(f"[+] Creating AVD '{AVD_NAME}'...")
-    cmd = (
-        f"echo no | {AVDMANAGER_PATH} create avd "
-        f"--name {AVD_NAME} --package '{IMAGE_NAME}' --device 'pixel'"
+    run(
+        [AVDMANAGER_PATH, "create", "avd", "--name", AVD_NAME, "--package", IMAGE_NAME, "--device", "pixel"],
+        input="no\n"
     )
-    run(cmd)
 
 
 def test_kvm():
     print("\n[+] Checking for hardware virtualization (KVM)...")
-    result = subprocess.run("egrep -c '(vmx|svm)' /proc/cpuinfo", shell=True, capture_output=True, text=True)
-    if result.returncode == 0 and int(result.stdout.strip()) > 0:
+    try:
+        with open("/proc/cpuinfo", "rb") as f:
+            cpuinfo = f.read()
+    except OSError:
+        cpuinfo = b""
+    if b"vmx" in cpuinfo or b"svm" in cpuinfo:
         print("[+] KVM virtualization supported.")
+        # The CPU flag alone isn't enough: the emulator needs read/write on /dev/kvm
+        if not os.access("/dev/kvm", os.R_OK | os.W_OK):
+            print("[-] /dev/kvm is not accessible; add your user to the 'kvm' group and log in again.")
     else:
         print("[-] KVM not detected. Emulator performance may be degraded.")
 
@@ -155,66 +331,113 @@ def launch_emulator_background():
     if not emulator.exists():
         sys.exit("[-] Emulator binary not found. Check installation.")
     print(f"[+] Launching emulator '{AVD_NAME}' in background...")
-    cmd = f"{emulator} -avd {AVD_NAME} -no-snapshot -no-boot-anim -gpu off &"
-    subprocess.Popen(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    print("[+] Emulator started in background. Waiting for it to boot...")
-    run("adb wait-for-device", check=False)
-    for _ in range(30):
-        boot_status = subprocess.run("adb shell getprop sys.boot_completed", shell=True, capture_output=True, text=True)
-        if boot_status.stdout.strip() == "1":
+    # start_new_session detaches it like the old trailing `&` did
+    proc = subprocess.Popen(
+        [emulator, "-avd", AVD_NAME, "-no-snapshot", "-no-boot-anim", "-gpu", "off"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    print("[+] Emulator started in background.")
+    return proc
+
+
+def wait_for_boot(proc):
+    print("[+] Waiting for the emulator to boot...")
+    # One adb call: wait for the device, then poll the property on the device
+    # itself, returning as soon as boot completes rather than on a 5 s tick.
+    try:
+        result = subprocess.run(
+            ["adb", "wait-for-device", "shell",
+             "while [ \"$(getprop sys.boot_completed)\" != 1 ]; do sleep 1; done"],
+            timeout=BOOT_TIMEOUT
+        )
+        if result.returncode == 0:
             print("[+] Emulator fully booted.")
             return
-        time.sleep(5)
-    print("[!] Warning: Emulator may not have finished booting yet.")
+    except subprocess.TimeoutExpired:
+        pass
+    if proc.poll() is not None:
+        print(f"[-] Emulator exited early with code {proc.returncode}.")
+    else:
+        print("[!] Warning: Emulator may not have finished booting yet.")
 
 
 def is_port_open(host, port):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(1)
-        try:
-            s.connect((host, port))
+    try:
+        with socket.create_connection((host, port), timeout=PORT_PROBE_TIMEOUT):
             return True
-        except (socket.timeout, ConnectionRefusedError, OSError):
-            return False
+    except OSError:
+        return False
+
+
+def parse_proxy(value):
+    # argparse type for --proxy: IPv4 address or hostname, optional :PORT.
+    # Rejecting anything else up front matters because the value ends up in
+    # a device shell command, and a typo is better caught before the setup runs.
+    host, sep, port_str = value.partition(":")
+    try:
+        ipaddress.IPv4Address(host)
+    except ValueError:
+        if not HOSTNAME_RE.fullmatch(host):
+            raise argparse.ArgumentTypeError(f"invalid proxy host: {host!r}")
+    if not sep:
+        return host, DEFAULT_PROXY_PORT
+    if not port_str.isdigit() or not 1 <= int(port_str) <= 65535:
+        raise argparse.ArgumentTypeError(f"invalid proxy port: {port_str!r}")
+    return host, int(port_str)
 
 
 def configure_proxy(proxy=None):
+    # proxy: (host, port) from parse_proxy, or None
     if not proxy:
         print("[i] No proxy specified; skipping proxy configuration.")
         return
-    if ":" in proxy:
-        host, port_str = proxy.split(":", 1)
-        port = int(port_str)
-    else:
-        host, port = proxy, 8080
+    host, port = proxy
     if not is_port_open(host, port):
         print(f"[-] Warning: Nothing appears to be listening on {host}:{port}. Proxy may not work.")
     else:
         print(f"[+] Detected open port {port} on {host} — continuing proxy setup.")
     print(f"[+] Setting Android emulator proxy to {host}:{port}...")
-    run("adb root", check=False)
-    run(f"adb shell settings put global http_proxy {host}:{port}", check=False)
-    run(f"adb shell settings put global https_proxy {host}:{port}", check=False)
-    print("[+] Proxy settings applied. Verifying...")
-    run("adb shell settings get global http_proxy", check=False)
+    # One adb round trip sets both proxies and reads the value back; the shell
+    # user may write global settings, so no `adb root` (and adbd restart) needed
+    value = shlex.quote(f"{host}:{port}")  # the device shell parses this string
+    run(["adb", "shell",
+         f"settings put global http_proxy {value}; "
+         f"settings put global https_proxy {value}; "
+         "settings get global http_proxy"], check=False)
+    print("[+] Proxy settings applied (value echoed above).")
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Android Emulator Setup (with optional proxy)")
-    parser.add_argument("--proxy", type=str, help="Proxy in format IP[:PORT] (e.g., 192.168.1.10:8080)")
+    parser.add_argument("--proxy", type=parse_proxy, help="Proxy in format IP[:PORT] (e.g., 192.168.1.10:8080)")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    ensure_dependencies()
-    ensure_java_home()
-    ensure_cmdline_tools()
+    # The SDK zip download doesn't depend on apt, so fetch it while the
+    # dependencies install
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        download = None if SDKMANAGER_PATH.exists() else pool.submit(download_cmdline_tools)
+        ensure_dependencies()
+        ensure_java_home()
+        ensure_cmdline_tools(download)
+    except BaseException:
+        # sys.exit or Ctrl-C: stop the download at its next chunk rather than
+        # waiting for it to finish (worker threads are still joined at exit)
+        DOWNLOAD_ABORT.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
     setup_env()
     install_sdk_components()
-    test_kvm()
     create_avd()
-    launch_emulator_background()
+    # Only the proxy step needs a booted emulator: start it as soon as the AVD
+    # exists and do the remaining local work while it boots
+    emulator = launch_emulator_background()
+    test_kvm()
+    wait_for_boot(emulator)
     configure_proxy(args.proxy)
 
 